@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark MOSSE throughput, latency, memory and accuracy on synthetic
+sequences. Results are written as JSON. Two result files can be
+compared to catch performance regressions:
+
+    $ python benchmarks/bench_mosse.py --out new.json
+    $ python benchmarks/bench_mosse.py --compare old.json new.json
+
+Created on Sat Oct  9 11:02:51 2021
+
+@author: niklas
+"""
+
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+
+from mossepy.fft_backend import pyfftw
+from mossepy.mosse_tracker import MOSSE
+from mossepy.multi_mosse_tracker import MultiMOSSE
+from synthetic import makeSequence
+
+
+def stats(times):
+    """
+    Summarize times in ms.
+
+    Parameters
+    ----------
+    times : list of floats
+        times in s.
+
+    Returns
+    -------
+    stats : dict
+        median, p95 and mean in ms.
+
+    """
+    times = 1e3 * np.array(times)
+
+    return {'median': float(np.median(times)),
+            'p95': float(np.percentile(times, 95)),
+            'mean': float(times.mean())}
+
+
+def accuracy(pos, truth):
+    """
+    Calculate tracking accuracy.
+
+    Parameters
+    ----------
+    pos : numpy array
+        tracked positions of shape (nFrames, nTargets, 2).
+    truth : numpy array
+        true positions of same shape.
+
+    Returns
+    -------
+    acc : dict
+        mean position error in pixels and fraction of positions
+        within 5 pixels of truth.
+
+    """
+    err = np.linalg.norm(pos - truth, axis=-1)
+
+    return {'meanErr': float(err.mean()),
+            'precision5': float(np.mean(err <= 5.))}
+
+
+def benchMOSSE(tempSize, trainSteps, backend, nFrames, repeats):
+    """
+    Benchmark single object MOSSE tracker.
+
+    Parameters
+    ----------
+    tempSize : int
+        edge length of template.
+    trainSteps : int
+        number of initial training steps.
+    backend : string
+        FFT backend.
+    nFrames : int
+        number of frames.
+    repeats : int
+        number of filter initializations timed.
+
+    Returns
+    -------
+    result : dict
+        benchmark result.
+
+    """
+    frames, truth = makeSequence(nFrames, tempSize)
+
+    tracker = MOSSE(tempSize=[tempSize, tempSize], trainSteps=trainSteps,
+                    fftBackend=backend, seed=0)
+    tracker.I = frames[0]
+
+    # init latency
+    initTimes = []
+    for _ in range(repeats):
+        tracker.setObjPos(list(truth[0, 0]))
+        start = time.perf_counter()
+        tracker.initFilter()
+        initTimes.append(time.perf_counter() - start)
+
+    # steady state latency per frame
+    frameTimes = []
+    pos = [tracker.objPos]
+    for I in frames[1:]:
+        tracker.I = I
+        start = time.perf_counter()
+        tracker.calObjPos()
+        tracker.updateFilter()
+        frameTimes.append(time.perf_counter() - start)
+        pos.append(tracker.objPos)
+
+    # memory of filter state and peak memory of init and some frames
+    state = tracker.state
+    stateBytes = state.A.nbytes + state.B.nbytes + state.conjH.nbytes
+
+    tracemalloc.start()
+    tracker.I = frames[0]
+    tracker.setObjPos(list(truth[0, 0]))
+    tracker.initFilter()
+    for I in frames[1:4]:
+        tracker.I = I
+        tracker.calObjPos()
+        tracker.updateFilter()
+    peakBytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    frame = stats(frameTimes)
+
+    result = {'bench': 'mosse',
+              'tempSize': tempSize,
+              'trainSteps': trainSteps,
+              'backend': backend,
+              'targets': 1,
+              'initMs': stats(initTimes),
+              'frameMs': frame,
+              'fps': 1e3 / frame['median'],
+              'stateBytes': stateBytes,
+              'peakBytes': peakBytes}
+    result.update(accuracy(np.array(pos)[:, None], truth))
+
+    return result
+
+
+def benchMulti(tempSize, trainSteps, backend, nTargets, nFrames):
+    """
+    Benchmark multi object MOSSE tracker.
+
+    Parameters
+    ----------
+    tempSize : int
+        edge length of template.
+    trainSteps : int
+        number of initial training steps.
+    backend : string
+        FFT backend.
+    nTargets : int
+        number of objects.
+    nFrames : int
+        number of frames.
+
+    Returns
+    -------
+    result : dict
+        benchmark result.
+
+    """
+    frames, truth = makeSequence(nFrames, tempSize, nTargets)
+
+    tracker = MultiMOSSE(tempSize=[tempSize, tempSize], trainSteps=trainSteps,
+                         fftBackend=backend, seed=0)
+
+    initTimes = []
+    for k in range(nTargets):
+        start = time.perf_counter()
+        tracker.addTarget(frames[0], truth[0, k])
+        initTimes.append(time.perf_counter() - start)
+
+    frameTimes = []
+    pos = [tracker.objPos]
+    for I in frames[1:]:
+        start = time.perf_counter()
+        pos.append(tracker.trackFrame(I))
+        frameTimes.append(time.perf_counter() - start)
+
+    state = tracker.state
+    frame = stats(frameTimes)
+
+    result = {'bench': 'multi',
+              'tempSize': tempSize,
+              'trainSteps': trainSteps,
+              'backend': backend,
+              'targets': nTargets,
+              'initMs': stats(initTimes),
+              'frameMs': frame,
+              'fps': 1e3 / frame['median'],
+              'targetMs': frame['median'] / nTargets,
+              'stateBytes': state.A.nbytes + state.B.nbytes + state.conjH.nbytes}
+    result.update(accuracy(np.array(pos), truth))
+
+    return result
+
+
+def key(result):
+    """
+    Key identifying benchmark configuration.
+
+    Parameters
+    ----------
+    result : dict
+        benchmark result.
+
+    Returns
+    -------
+    key : tuple
+        bench, tempSize, trainSteps, backend and targets.
+
+    """
+    return (result['bench'], result['tempSize'], result['trainSteps'],
+            result['backend'], result['targets'])
+
+
+def compare(oldPath, newPath, tolerance):
+    """
+    Compare median latencies of two result files.
+
+    Parameters
+    ----------
+    oldPath : string
+        path of reference results.
+    newPath : string
+        path of new results.
+    tolerance : float
+        allowed relative increase of latency.
+
+    Returns
+    -------
+    regressions : int
+        number of latencies exceeding tolerance.
+
+    """
+    with open(oldPath) as file:
+        old = {key(r): r for r in json.load(file)['results']}
+    with open(newPath) as file:
+        new = {key(r): r for r in json.load(file)['results']}
+
+    regressions = 0
+    for k in sorted(set(old) & set(new), key=str):
+        for metric in ('initMs', 'frameMs'):
+            ratio = new[k][metric]['median'] / old[k][metric]['median']
+            flag = ''
+            if ratio > 1. + tolerance:
+                flag = '  <-- regression'
+                regressions += 1
+            print('%-45s %-8s %6.2fx%s' % (k, metric, ratio, flag))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--temp-sizes', type=int, nargs='+',
+                        default=[32, 64, 100, 128, 256])
+    parser.add_argument('--train-steps', type=int, nargs='+', default=[16, 256])
+    parser.add_argument('--targets', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--backends', nargs='+', default=None,
+                        help='default: all available backends')
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.tolerance) else 0)
+
+    backends = args.backends
+    if backends is None:
+        backends = ['numpy', 'scipy'] + (['pyfftw'] if pyfftw else [])
+
+    results = []
+    for backend in backends:
+        for tempSize in args.temp_sizes:
+            for trainSteps in args.train_steps:
+                result = benchMOSSE(tempSize, trainSteps, backend,
+                                    args.frames, args.repeats)
+                print(key(result), '%.3f ms/frame' % result['frameMs']['median'])
+                results.append(result)
+
+            # multi object tracking with smallest number of training steps
+            for nTargets in args.targets:
+                result = benchMulti(tempSize, min(args.train_steps), backend,
+                                    nTargets, args.frames)
+                print(key(result), '%.3f ms/frame' % result['frameMs']['median'])
+                results.append(result)
+
+    meta = {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+    with open(args.out, 'w') as file:
+        json.dump({'meta': meta, 'results': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
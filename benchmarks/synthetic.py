@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic image sequences with known object trajectories.
+
+Created on Sat Oct  9 10:14:27 2021
+
+@author: niklas
+"""
+
+
+import numpy as np
+import scipy.ndimage as nd
+
+
+def makeTexture(size, rng):
+    """
+    Create random object texture with Gaussian envelope.
+
+    Parameters
+    ----------
+    size : int
+        edge length of texture.
+    rng : numpy Generator
+        random number generator.
+
+    Returns
+    -------
+    T : numpy array
+        texture with values in [-1, 1].
+
+    """
+    T = nd.gaussian_filter(rng.standard_normal((size, size)), 1.5)
+    T /= np.abs(T).max()
+
+    # fade out towards edges
+    x = np.linspace(-1, 1, size)
+    X, Y = np.meshgrid(x, x)
+    T *= np.exp(-(X**2 + Y**2) / 0.3)
+
+    return T
+
+
+def makeSequence(nFrames=50, tempSize=128, nTargets=1, speed=2., noise=4., seed=0):
+    """
+    Create grayscale image sequence of textured objects moving on
+    textured background. Objects move with constant speed and are
+    reflected at a margin of one template size from image borders.
+
+    Parameters
+    ----------
+    nFrames : int. optional.
+        number of frames. default is 50.
+    tempSize : int. optional.
+        template size used for tracking. object size and image size
+        are derived from it. default is 128.
+    nTargets : int. optional.
+        number of objects. default is 1.
+    speed : float. optional.
+        object speed in pixels per frame. default is 2.
+    noise : float. optional.
+        standard deviation of additive noise. default is 4.
+    seed : int. optional.
+        seed of random number generator. default is 0.
+
+    Returns
+    -------
+    frames : numpy array
+        uint8 frames of shape (nFrames, H, W).
+    truth : numpy array
+        object positions of shape (nFrames, nTargets, 2).
+
+    """
+    rng = np.random.default_rng(seed)
+
+    size = max(480, 4 * tempSize)
+    shape = np.array([size, size])
+    margin = tempSize
+
+    background = nd.gaussian_filter(rng.random((size, size)), 3.)
+    background = 60. + 400. * (background - background.mean())
+
+    objSize = tempSize // 2
+    textures = [makeTexture(objSize, rng) for _ in range(nTargets)]
+
+    # start positions and velocities
+    pos = rng.uniform(margin, size - margin, (nTargets, 2))
+    ang = rng.uniform(0., 2. * np.pi, nTargets)
+    vel = speed * np.stack((np.cos(ang), np.sin(ang)), axis=1)
+
+    frames = np.empty((nFrames, size, size), dtype=np.uint8)
+    truth = np.empty((nFrames, nTargets, 2), dtype=int)
+
+    for i in range(nFrames):
+        I = background + noise * rng.standard_normal((size, size))
+
+        for k in range(nTargets):
+            p = np.round(pos[k]).astype(int)
+            truth[i, k] = p
+
+            r0 = p[0] - objSize // 2
+            c0 = p[1] - objSize // 2
+            I[r0:r0+objSize, c0:c0+objSize] += 120. * textures[k]
+
+        frames[i] = np.clip(I, 0, 255)
+
+        # move objects and reflect them at margins
+        pos += vel
+        low = pos < margin
+        high = pos > shape - margin
+        vel[low | high] *= -1
+        pos = np.clip(pos, margin, shape - margin)
+
+    return frames, truth
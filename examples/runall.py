@@ -16,5 +16,7 @@ objPos = [256, 256]
 tracker = MOSSE()
 # initialize object position in first frame
 tracker.setObjPos(objPos)
+# show template, filter and response while tracking
+tracker.showLive()
 # start tracking
 tracker.trackImg()
\ No newline at end of file
@@ -7,10 +7,16 @@ Created on Sat Aug 14 11:57:40 2021
 """
 
 
-import os
+import numpy as np
 
-import mossepy.image as img
+import mossepy.state_io as sio
 from mossepy.correlation_tracker import Correlation
+from mossepy.crop import Cropper
+from mossepy.fft_backend import getBackend
+from mossepy.filter_state import FilterState
+from mossepy.frame_source import DirectorySource, toSource
+from mossepy.preprocess import Preprocessor
+from mossepy.redetection import Redetector
 
 
 class AdpCorrelation(Correlation):
@@ -29,7 +35,11 @@ class AdpCorrelation(Correlation):
                  sigma, 
                  eps,
                  trainSteps,
-                 rate):
+                 rate,
+                 fftBackend='numpy',
+                 workers=None,
+                 seed=None,
+                 dtype='float64'):
         """
         constructor of adaptive correlation tracker class
 
@@ -51,6 +61,17 @@ class AdpCorrelation(Correlation):
             number of initial training steps
         rate : float
             filter learning rate used in running average.
+        fftBackend : string or backend object. optional.
+            FFT backend, 'numpy', 'scipy' or 'pyfftw'. default is 'numpy'.
+        workers : int. optional.
+            number of FFT threads, if supported by backend. default is None.
+        seed : int. optional.
+            seed of random training perturbations. default is None.
+        dtype : string or numpy dtype. optional.
+            float type used in computations, 'float64' or 'float32'.
+            spectra are of corresponding complex type. float32
+            halves memory traffic at a relative error of about 1e-6.
+            default is 'float64'.
 
         Returns
         -------
@@ -65,45 +86,376 @@ class AdpCorrelation(Correlation):
                              valRange, 
                              tempSize, 
                              sigma, 
-                             eps)
+                             eps,
+                             fftBackend,
+                             workers,
+                             dtype)
         
         # number of training steps
         self.trainSteps = trainSteps
         # learning rate
         self.rate = rate
+        # random number generator for training
+        self.rng = np.random.default_rng(seed)
         
-    def trackImg(self):
+        # number of current frame
+        self.i = 0
+        # min PSR of frames used for filter update
+        self.psrMin = None
+        
+        # full frame search of lost object
+        self.redetector = None
+        self.psrLost = None
+        
+    def setUpdateThreshold(self, psrMin=7.):
         """
-        Track object over all images in given directory.
+        Set min Peak-to-Sidelobe Ratio (PSR) of frames used for filter
+        update. Frames of lower PSR, e.g. due to occlusion, are tracked
+        without updating the filter.
+
+        Parameters
+        ----------
+        psrMin : float. optional.
+            min PSR. None updates the filter on all frames. default is 7.
 
         Returns
         -------
         None.
 
         """
-        self.i = 0
+        self.psrMin = psrMin
+        
+    def enableRedetection(self, psrLost=5., tileSize=None, maxTiles=16):
+        """
+        Enable re-detection of lost objects. If the PSR of a frame
+        falls below psrLost, the filter is correlated over tiles of the
+        whole frame. At most maxTiles tiles are searched per frame,
+        the search of remaining tiles continues in subsequent frames.
+        If no update threshold is set, it is set to psrLost.
+
+        Parameters
+        ----------
+        psrLost : float. optional.
+            PSR below which object is considered lost. default is 5.
+        tileSize : list of ints. optional.
+            vertical and horizontal FFT size of tiles. default is None,
+            i.e. four times the template size.
+        maxTiles : int. optional.
+            max number of tiles searched per frame. default is 16.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.psrLost = psrLost
+        self.redetector = Redetector(self.state, self.tempSize, tileSize, maxTiles,
+                                     self.cropper.binning, self.eps)
+        
+        if self.psrMin is None:
+            self.psrMin = psrLost
         
-        # iterate over image files in input directory
-        for self.imgFile in sorted(os.listdir(self.inDir)):
-            if self.imgFile.endswith('.jpg'):
-                self.i += 1
+    def disableRedetection(self):
+        """
+        Disable re-detection of lost objects.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.redetector = None
+        self.psrLost = None
+        
+    def setBinning(self, binning=2):
+        """
+        Set binning of templates, see Correlation.setBinning. An enabled
+        re-detector is rebuilt, such that it searches the binned filter.
+
+        Parameters
+        ----------
+        binning : int. optional.
+            edge length of cells. default is 2.
+
+        Returns
+        -------
+        None.
+
+        """
+        Correlation.setBinning(self, binning)
+        
+        # re-detector has to search new filter
+        if self.redetector is not None:
+            self.enableRedetection(self.psrLost, None, self.redetector.maxTiles)
+        
+    def redetect(self):
+        """
+        Search lost object in current frame. The best match found
+        is accepted, if its PSR exceeds the PSR of the local search.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.prof.stage('redetect'):
+            pos, _ = self.redetector.search(self.I, self.objPos, self.fft, self.dtype)
+        
+        if pos == self.objPos:
+            return
+        
+        # keep result of local search. template buffer is reused
+        local = (self.objPos, self.subPos, self.peak, self.psr,
+                 self.subOffset, self.f.copy(), self.g)
+        
+        self.setObjPos(pos)
+        self.calObjPos()
+        
+        if self.psr < local[3]:
+            (self.objPos, self.subPos, self.peak, self.psr,
+             self.subOffset, self.f, self.g) = local
+        
+    def track(self, frames, resume=False):
+        """
+        Track object over given frames. Results are yielded per frame,
+        before the filter is updated on the frame.
+
+        Parameters
+        ----------
+        frames : frame source, sequence or numpy array
+            frames to be tracked. Plain frames are wrapped
+            into an array source.
+        resume : bool. optional.
+            if True, tracking is continued with current filter, e.g.
+            after loading a state, instead of initializing the filter
+            on first frame. default is False.
+
+        Yields
+        ------
+        imgFile : string
+            name of current frame.
+        objPos : list of ints
+            object position in current frame.
+
+        """
+        if not resume:
+            self.i = 0
+        
+        for self.imgFile, self.I in self.prof.iterate('read', toSource(frames)):
+            self.i += 1
+            
+            if self.i == 1:
+                # initialize filter on first object position
+                with self.prof.stage('init'):
+                    self.initFilter()
                 
-                imgPath = self.inDir + '/' + self.imgFile
-                self.I = img.read(imgPath)
+                yield self.imgFile, self.objPos
                 
-                if self.i == 1:  
-                    # initialize filter on first object position
-                    self.initFilter()
-                    
-                    self.saveResults()                 
-                    self.showResults()
-                    
-                else:
-                    # find object position in new image
-                    self.calObjPos()
-                    
-                    self.saveResults()                 
-                    self.showResults()
-
-                    # update filter on new object position
-                    self.updateFilter()
\ No newline at end of file
+            else:
+                # find object position in new image
+                self.calObjPos()
+                
+                # search whole frame, if object is lost
+                if self.redetector is not None:
+                    if self.psr < self.psrLost:
+                        self.redetect()
+                    else:
+                        self.redetector.reset()
+                
+                yield self.imgFile, self.objPos
+                
+                # update filter on new object position,
+                # if tracking is confident
+                if self.psrMin is None or self.psr >= self.psrMin:
+                    self.updateFilter()
+                
+            self.prof.frame()
+        
+    def trackImg(self, prefetch=0, gray=False):
+        """
+        Track object over all images in input directory.
+
+        Parameters
+        ----------
+        prefetch : int. optional.
+            number of images decoded ahead in background threads.
+            default is 0.
+        gray : bool. optional.
+            if True, images are converted to grayscale on decoding.
+            default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+        source = DirectorySource(self.inDir, prefetch=prefetch, gray=gray)
+        
+        for _ in self.track(source):
+            self.saveResults()
+            self.showResults()
+            self.notifyObservers()
+            
+        self.writer.close()
+        # write results buffered by observers, e.g. result stores
+        for observer in self.observers:
+            if hasattr(observer, 'close'):
+                observer.close()
+        
+    def saveState(self, path, single=False):
+        """
+        Save tracker state, i.e. filter spectra, object position,
+        frame number, parameters and state of random number generator,
+        to a binary file.
+
+        Parameters
+        ----------
+        path : string
+            path of state file.
+        single : bool. optional.
+            if True, spectra are saved in single precision.
+            default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+        header = self.stateHeader()
+        
+        arrays = self.stateArrays()
+        if single:
+            for name, arr in arrays.items():
+                if arr.dtype == np.complex128:
+                    arrays[name] = arr.astype(np.complex64)
+                elif arr.dtype == np.float64:
+                    arrays[name] = arr.astype(np.float32)
+        
+        sio.save(path, header, arrays)
+        
+    def stateHeader(self):
+        """
+        Get parameters and position saved in header of tracker state.
+        Extended by inherited classes with parameters of their own.
+
+        Returns
+        -------
+        header : dict
+            JSON serializable parameters and position.
+
+        """
+        return {'tracker': type(self).__name__,
+                'valRange': self.valRange,
+                'tempSize': list(self.tempSize),
+                'sigma': list(self.sigma),
+                'eps': self.eps,
+                'trainSteps': self.trainSteps,
+                'rate': self.rate,
+                'fftBackend': self.fft.name,
+                'workers': getattr(self.fft, 'workers', None),
+                'dtype': self.dtype.str,
+                'binning': self.cropper.binning,
+                'objPos': [int(x) for x in self.objPos],
+                'i': self.i,
+                'rng': self.rng.bit_generator.state}
+        
+    def setStateHeader(self, header):
+        """
+        Set parameters of inherited class from header of loaded
+        tracker state. Called after filter and position are set.
+
+        Parameters
+        ----------
+        header : dict
+            header returned by stateHeader.
+
+        Returns
+        -------
+        None.
+
+        """
+        pass
+        
+    def stateArrays(self):
+        """
+        Get arrays of filter saved in tracker state.
+
+        Returns
+        -------
+        arrays : dict of numpy arrays
+            numerator A and denominator B of filter.
+
+        """
+        return {'A': self.state.A, 'B': self.state.B}
+        
+    def setStateArrays(self, arrays):
+        """
+        Set filter from arrays of loaded tracker state.
+
+        Parameters
+        ----------
+        arrays : dict of numpy arrays
+            arrays returned by stateArrays.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.state.setSpectra(arrays['A'], arrays['B'])
+        
+    def loadState(self, path, mmap=True):
+        """
+        Load tracker state saved by saveState. Tracking is continued
+        by track(frames, resume=True).
+
+        Parameters
+        ----------
+        path : string
+            path of state file.
+        mmap : bool. optional.
+            if True, spectra are memory mapped from file instead of
+            being read. default is True.
+
+        Returns
+        -------
+        None.
+
+        """
+        header, arrays = sio.load(path, mmap)
+        
+        if header['tracker'] != type(self).__name__:
+            raise ValueError('state of ' + header['tracker'] +
+                             ' can not be loaded by ' + type(self).__name__)
+        
+        self.valRange = header['valRange']
+        self.tempSize = header['tempSize']
+        self.sigma = header['sigma']
+        self.eps = header['eps']
+        self.trainSteps = header['trainSteps']
+        self.rate = header['rate']
+        
+        self.dtype = np.dtype(header['dtype'])
+        self.fft = getBackend(header['fftBackend'], header['workers'])
+        self.rng.bit_generator.state = header['rng']
+        
+        # standard deviations are given in image pixels
+        binning = header.get('binning', 1)
+        sigma = [self.sigma[0] / binning, self.sigma[1] / binning]
+        
+        self.state = FilterState(self.valRange, self.tempSize, sigma,
+                                 self.fft, self.dtype)
+        self.cropper = Cropper(self.tempSize, self.cropper.mode, self.cropper.cval,
+                               self.dtype, binning)
+        self.pre = Preprocessor(self.tempSize, self.eps, self.dtype)
+        self.setStateArrays(arrays)
+        
+        # re-detector has to search new filter
+        if self.redetector is not None:
+            self.enableRedetection(self.psrLost, self.redetector.tileSize,
+                                   self.redetector.maxTiles)
+        
+        self.objPos = header['objPos']
+        self.i = header['i']
+        
+        self.setStateHeader(header)
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Track many independent sequences in a pool of processes.
+
+Sequences are given by a manifest, i.e. a list of entries
+
+    {"id": "clip0001",
+     "source": "/path/to/frames",
+     "objPos": [256, 256],
+     "params": {"tempSize": [64, 64]}}
+
+where source is an image directory, a .npy file or a raw video file
+(which needs "shape" in the entry). Positions of each sequence are
+written to <id>.csv in the output directory and optionally with peak,
+PSR and timing per frame to a result store. Finished ids are appended
+to a checkpoint file, such that an interrupted run can be resumed.
+
+Usage from command line:
+
+    $ python -m mossepy.batch_runner manifest.jsonl outDir -p 8
+
+Created on Sat Oct 16 13:37:09 2021
+
+@author: niklas
+"""
+
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# threadpoolctl is optional
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+from mossepy.frame_source import DirectorySource, MemmapSource
+from mossepy.mosse_tracker import MOSSE
+from mossepy.results_store import ResultStore
+
+
+# environment variables limiting threads of numerical libraries
+THREAD_VARS = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+               'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS']
+
+# limits of thread pools of worker process, kept alive
+_limits = None
+
+
+def loadManifest(path):
+    """
+    Load manifest from .json file holding a list of entries or
+    from .jsonl file holding one entry per line.
+
+    Parameters
+    ----------
+    path : string
+        path of manifest.
+
+    Returns
+    -------
+    manifest : list of dicts
+        manifest entries.
+
+    """
+    with open(path) as file:
+        if path.endswith('.jsonl'):
+            return [json.loads(line) for line in file if line.strip()]
+
+        return json.load(file)
+
+
+def openSource(entry):
+    """
+    Open frame source of manifest entry.
+
+    Parameters
+    ----------
+    entry : dict
+        manifest entry.
+
+    Returns
+    -------
+    source : frame source
+        frames of sequence.
+
+    """
+    source = entry['source']
+
+    if os.path.isdir(source):
+        return DirectorySource(source)
+
+    return MemmapSource(source, entry.get('shape'), entry.get('dtype', 'uint8'))
+
+
+def initWorker(threads):
+    """
+    Limit threads of numerical libraries in worker process
+    to avoid oversubscription of cores. Environment variables only
+    take effect before numpy is loaded, i.e. in spawned workers, so
+    thread pools already loaded are limited by threadpoolctl, if
+    installed.
+
+    Parameters
+    ----------
+    threads : int
+        max number of threads per worker.
+
+    Returns
+    -------
+    None.
+
+    """
+    global _limits
+
+    for var in THREAD_VARS:
+        os.environ[var] = str(threads)
+
+    if threadpool_limits is not None:
+        _limits = threadpool_limits(threads)
+
+
+def runSequence(entry, outDir, threads, store=None):
+    """
+    Track object over sequence of manifest entry and write
+    positions to <id>.csv in output directory and optionally
+    all results to result store.
+
+    Parameters
+    ----------
+    entry : dict
+        manifest entry.
+    outDir : string
+        output directory.
+    threads : int
+        number of FFT threads.
+    store : string. optional.
+        directory of result store. default is None, i.e. no store.
+
+    Returns
+    -------
+    seqId : string
+        id of sequence.
+    positions : list
+        object position per frame.
+
+    """
+    # numpy backend ignores workers, so scipy is used by default
+    params = dict(entry.get('params', {}))
+    params.setdefault('fftBackend', 'scipy')
+    params.setdefault('workers', threads)
+
+    tracker = MOSSE(**params)
+    tracker.setObjPos(list(entry['objPos']))
+
+    # records of an interrupted run are replaced
+    records = None
+    if store is not None:
+        records = ResultStore(store).writer(entry['id'], mode='w')
+
+    names = []
+    positions = []
+    last = time.perf_counter()
+    for name, objPos in tracker.track(openSource(entry)):
+        names.append(os.path.splitext(name)[0])
+        positions.append([int(objPos[0]), int(objPos[1])])
+
+        if records is not None:
+            now = time.perf_counter()
+            records(tracker, now - last)
+            last = now
+
+    if records is not None:
+        records.close()
+
+    # write to temporary file first, such that no partial
+    # results are left in case of a crash
+    path = outDir + '/' + str(entry['id']) + '.csv'
+    with open(path + '.tmp', 'w') as file:
+        file.write('frame,row,col\n')
+        for name, pos in zip(names, positions):
+            file.write('%s,%d,%d\n' % (name, pos[0], pos[1]))
+    os.replace(path + '.tmp', path)
+
+    return entry['id'], positions
+
+
+class BatchRunner(object):
+    """
+    Runner distributing sequences of a manifest over a process pool.
+    """
+
+    def __init__(self, outDir, processes=None, threads=1, checkpoint=None, store=None):
+        """
+        constructor of batch runner class.
+
+        Parameters
+        ----------
+        outDir : string
+            output directory. created, if not existing.
+        processes : int. optional.
+            number of worker processes. default is None, i.e. number of CPUs.
+        threads : int. optional.
+            number of threads per worker, used for FFTs. default is 1.
+        checkpoint : string. optional.
+            path of checkpoint file. default is None,
+            i.e. checkpoint.txt in output directory.
+        store : string. optional.
+            directory of result store. default is None, i.e. no store.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.outDir = os.path.abspath(outDir)
+        os.makedirs(self.outDir, exist_ok=True)
+
+        self.processes = processes
+        self.threads = threads
+
+        if checkpoint is None:
+            checkpoint = self.outDir + '/checkpoint.txt'
+        self.checkpoint = checkpoint
+
+        if store is not None:
+            store = os.path.abspath(store)
+        self.store = store
+
+        # errors of failed sequences of last run by id
+        self.failures = {}
+
+    def finished(self):
+        """
+        Read ids of finished sequences from checkpoint file.
+
+        Returns
+        -------
+        ids : set of strings
+            ids of finished sequences.
+
+        """
+        if not os.path.exists(self.checkpoint):
+            return set()
+
+        with open(self.checkpoint) as file:
+            return set(line.strip() for line in file if line.strip())
+
+    def run(self, manifest):
+        """
+        Track all unfinished sequences of manifest. Results are
+        yielded as soon as sequences are finished. Failed sequences
+        are reported, collected in failures and tracked again,
+        when the run is resumed.
+
+        Parameters
+        ----------
+        manifest : list of dicts or string
+            manifest entries or path of manifest.
+
+        Yields
+        ------
+        seqId : string
+            id of sequence.
+        positions : list
+            object position per frame.
+
+        """
+        if isinstance(manifest, str):
+            manifest = loadManifest(manifest)
+
+        done = self.finished()
+        todo = [entry for entry in manifest if str(entry['id']) not in done]
+        self.failures = {}
+
+        # spawned workers inherit thread limits of environment,
+        # before they load numpy
+        env = {var: os.environ.get(var) for var in THREAD_VARS}
+        for var in THREAD_VARS:
+            os.environ[var] = str(self.threads)
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.processes,
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=initWorker,
+                                     initargs=(self.threads,)) as pool, \
+                 open(self.checkpoint, 'a') as checkpoint:
+
+                futures = {pool.submit(runSequence, entry, self.outDir,
+                                       self.threads, self.store): entry['id']
+                           for entry in todo}
+
+                for future in as_completed(futures):
+                    try:
+                        seqId, positions = future.result()
+                    except Exception as err:
+                        # other sequences are continued
+                        seqId = futures[future]
+                        self.failures[seqId] = err
+                        print('failed', seqId, ':', repr(err))
+                        continue
+
+                    # mark sequence as finished
+                    checkpoint.write(str(seqId) + '\n')
+                    checkpoint.flush()
+                    os.fsync(checkpoint.fileno())
+
+                    yield seqId, positions
+
+        finally:
+            for var, val in env.items():
+                if val is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = val
+
+
+def main():
+    parser = argparse.ArgumentParser(description='track sequences of manifest in process pool')
+    parser.add_argument('manifest', help='.json or .jsonl manifest')
+    parser.add_argument('outDir', help='output directory')
+    parser.add_argument('-p', '--processes', type=int, default=None)
+    parser.add_argument('-t', '--threads', type=int, default=1)
+    parser.add_argument('-c', '--checkpoint', default=None)
+    parser.add_argument('-s', '--store', default=None, help='directory of result store')
+    args = parser.parse_args()
+
+    runner = BatchRunner(args.outDir, args.processes, args.threads,
+                         args.checkpoint, args.store)
+
+    for seqId, positions in runner.run(args.manifest):
+        print('finished', seqId, 'with', len(positions), 'frames')
+
+    if runner.failures:
+        print(len(runner.failures), 'sequences failed')
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -10,9 +10,13 @@ Created on Sat Aug 14 11:56:40 2021
 import os
 import numpy as np
 
-import mossepy.utils as utils
-import mossepy.image as img
-import mossepy.visualization as vis
+import mossepy.response as resp
+import mossepy.result_writer as rw
+from mossepy.crop import Cropper
+from mossepy.profiling import NULL_PROFILER, Profiler
+from mossepy.fft_backend import fastSize, getBackend
+from mossepy.filter_state import FilterState
+from mossepy.preprocess import Preprocessor
 
 
 class Correlation(object):
@@ -29,7 +33,10 @@ class Correlation(object):
                  valRange, 
                  tempSize, 
                  sigma, 
-                 eps):
+                 eps,
+                 fftBackend='numpy',
+                 workers=None,
+                 dtype='float64'):
         """
         Constructor of correlation tracker class.
         Initalize basic tracker parameters.
@@ -44,10 +51,20 @@ class Correlation(object):
             image value range.
         tempSize : list of ints
             vertical and horizontal size of template to be cropped.
+            Enlarged to the next fast FFT sizes, if necessary.
         sigma : list of floats
             standard deviations of optimal filter response.
         eps : float
             regularization parameter
+        fftBackend : string or backend object. optional.
+            FFT backend, 'numpy', 'scipy' or 'pyfftw'. default is 'numpy'.
+        workers : int. optional.
+            number of FFT threads, if supported by backend. default is None.
+        dtype : string or numpy dtype. optional.
+            float type used in computations, 'float64' or 'float32'.
+            spectra are of corresponding complex type. float32
+            halves memory traffic at a relative error of about 1e-6.
+            default is 'float64'.
 
         Returns
         -------
@@ -61,31 +78,95 @@ class Correlation(object):
         
         # range of image values
         self.valRange = valRange
-        # size of the template f
-        self.tempSize = tempSize
+        # size of the template f, enlarged to fast FFT sizes
+        self.tempSize = fastSize(tempSize)
         # standard deviation used for optimal response distribution
         self.sigma = sigma
         # regularization parameter to avoid zero division
         self.eps = eps
+        
+        # float type of computations
+        self.dtype = np.dtype(dtype)
+        
+        # FFT backend used for all transforms
+        self.fft = getBackend(fftBackend, workers)
+        # filter in frequency domain with cached constants
+        self.state = FilterState(valRange, self.tempSize, sigma, self.fft, self.dtype)
+        # cropping of templates into preallocated buffer
+        self.cropper = Cropper(self.tempSize, dtype=self.dtype)
+        # pre-processing of templates into reused buffers
+        self.pre = Preprocessor(self.tempSize, eps, self.dtype)
+        
+        # output of results
+        self.setOutput()
+        # observers notified on each frame, e.g. live views
+        self.observers = []
+        # timing of tracking stages, disabled by default
+        self.prof = NULL_PROFILER
 
     def cropTemplate(self):
         """
-        Crop a template with defined size and center from image
+        Crop a template with defined size and center from image.
+        Only the template is converted to grayscale. Template parts
+        outside of the image are filled according to crop mode.
     
         Returns
         -------
         None.
     
         """
-        dx = int(self.tempSize[0]/2)
-        dy = int(self.tempSize[1]/2)
-        
         # crop template around object position from image        
-        self.f =  self.I[self.objPos[0]-dx:self.objPos[0]+dx,
-                         self.objPos[1]-dy:self.objPos[1]+dy]
+        with self.prof.stage('crop'):
+            self.f = self.cropper.crop(self.I, self.objPos)
+            
+    def setCropMode(self, mode='edge', cval=0.):
+        """
+        Set filling of template parts outside of image.
+
+        Parameters
+        ----------
+        mode : string. optional.
+            'edge' replicates border pixels, 'constant' uses cval.
+            default is 'edge'.
+        cval : float. optional.
+            value used in mode 'constant'. default is 0.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.cropper = Cropper(self.tempSize, mode, cval, self.dtype, self.cropper.binning)
+        
+    def setBinning(self, binning=2):
+        """
+        Set binning of templates. Regions of the current crop size are
+        cropped and averaged over cells of binning x binning pixels, such
+        that templates, filter and FFTs shrink by binning in each axis.
+        Binned templates are enlarged to fast FFT sizes, if necessary.
+        Standard deviations of the optimal response are kept in image
+        pixels. Has to be set before tracking.
+
+        Parameters
+        ----------
+        binning : int. optional.
+            edge length of cells. default is 2.
+
+        Returns
+        -------
+        None.
+
+        """
+        # binned templates cover at least current crop size
+        cropSize = self.cropper.cropSize
+        self.tempSize = fastSize([-(-cropSize[0] // binning), -(-cropSize[1] // binning)])
+        
+        sigma = [self.sigma[0] / binning, self.sigma[1] / binning]
         
-        # convert to grayscale
-        self.f = utils.rgb2Gray(self.f)
+        self.state = FilterState(self.valRange, self.tempSize, sigma, self.fft, self.dtype)
+        self.pre = Preprocessor(self.tempSize, self.eps, self.dtype)
+        self.cropper = Cropper(self.tempSize, self.cropper.mode, self.cropper.cval,
+                               self.dtype, binning)
             
     def calOptimalResponse(self):
         """
@@ -97,11 +178,9 @@ class Correlation(object):
         None.
 
         """
-        # optimal position of target is in center of template window
-        optPos = [int(self.tempSize[0]/2), int(self.tempSize[1]/2)]
-        
-        # optimal response is Gaussian centered in object position
-        self.g = utils.gauss2D(self.valRange, self.tempSize, optPos, self.sigma)
+        # optimal response is Gaussian centered in object position.
+        # it is cached by the filter state.
+        self.g = self.state.g
 
     def calFilterResponse(self):
         """
@@ -112,14 +191,28 @@ class Correlation(object):
         None.
 
         """
-        F = np.fft.fft2(self.f)        
-        H = np.fft.fft2(self.h)
-        conjH = np.conj(H)
+        with self.prof.stage('fft'):
+            F = self.fft.rfft2(self.f)
         
         # calculate correlation between template and filter
-        G = F * conjH
+        with self.prof.stage('respond'):
+            G = self.state.respond(F)
+        
+        # response of real template is real
+        with self.prof.stage('ifft'):
+            self.g = self.fft.irfft2(G, self.tempSize)
         
-        self.g = np.fft.ifft2(G)
+    def calSpatialFilter(self):
+        """
+        Calculate filter in spatial domain from filter state.
+        Only needed for output.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.h = self.state.spatial()
         
     def calObjPos(self):
         """
@@ -136,12 +229,42 @@ class Correlation(object):
         self.calFilterResponse()
         
         # maximum position in g
-        gPos = np.unravel_index(np.argmax(self.g, axis=None), self.g.shape)
+        gPos = self.analyzeResponse()
         
         # maximum position in full image from position of g
         # (old object position) and size of g
-        self.objPos = [gPos[0] + self.objPos[0]- int(self.tempSize[0]/2), 
-                      gPos[1] + self.objPos[1]- int(self.tempSize[1]/2)]
+        b = self.cropper.binning
+        dPos = [int(gPos[0]) - int(self.tempSize[0]/2), 
+                int(gPos[1]) - int(self.tempSize[1]/2)]
+        self.subPos = [self.objPos[0] + (dPos[0] + self.subOffset[0]) * b,
+                       self.objPos[1] + (dPos[1] + self.subOffset[1]) * b]
+        
+        if b == 1:
+            self.objPos = [self.objPos[0] + dPos[0], self.objPos[1] + dPos[1]]
+        else:
+            # integer peak of binned response is too coarse
+            self.objPos = [int(round(self.subPos[0])), int(round(self.subPos[1]))]
+        
+    def analyzeResponse(self):
+        """
+        Find maximum in response and refine it to subpixel accuracy.
+        Calculate peak value and Peak-to-Sidelobe Ratio (PSR) as
+        confidence of tracking.
+
+        Returns
+        -------
+        gPos : numpy array
+            integer position of maximum in response.
+
+        """
+        with self.prof.stage('peak'):
+            gPos = resp.findPeaks(self.g)
+            
+            self.peak = float(resp.peakValues(self.g, gPos))
+            self.psr = float(resp.calPSR(self.g, gPos))
+            self.subOffset = resp.refinePeaks(self.g, gPos)
+            
+        return gPos
         
     def setObjPos(self, objPos):
         """
@@ -158,6 +281,11 @@ class Correlation(object):
 
         """
         self.objPos = objPos
+        self.subPos = [float(objPos[0]), float(objPos[1])]
+        
+        # position is given, so confidence is maximal
+        self.peak = None
+        self.psr = np.inf
 
     def showResults(self):
         """
@@ -168,39 +296,137 @@ class Correlation(object):
         None.
 
         """
-        # fit images to valRange for output
-        f = (self.valRange-1)/self.f.max() * self.f
-        g = (self.valRange-1)/self.g.max() * self.g
-        h = (self.valRange-1)/self.h.max() * self.h
-            
         print('iteration: ', self.i)
         print('objPos: ', self.objPos)
         print('---------------------')
         
-        # show heat plots of template, filter and response
-        # in common figure
-        vis.comp3Heat(f, abs(np.fft.ifftshift(h)), abs(g))
+    def addObserver(self, observer):
+        """
+        Add observer called with tracker on each frame.
+
+        Parameters
+        ----------
+        observer : function
+            called as observer(tracker).
+
+        Returns
+        -------
+        None.
+
+        """
+        self.observers.append(observer)
+        
+    def notifyObservers(self):
+        """
+        Call all observers with tracker.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.prof.stage('show'):
+            for observer in self.observers:
+                observer(self)
+            
+    def enableProfiling(self, traceAlloc=False):
+        """
+        Time tracking stages. Timings are collected in self.prof.
+
+        Parameters
+        ----------
+        traceAlloc : bool. optional.
+            if True, memory allocated in stages is recorded, too.
+            default is False.
+
+        Returns
+        -------
+        prof : Profiler
+            profiler of tracker.
+
+        """
+        self.prof = Profiler(traceAlloc)
+        
+        return self.prof
+    
+    def disableProfiling(self):
+        """
+        Stop timing tracking stages.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.prof = NULL_PROFILER
+        
+    def showLive(self, interval=0.2):
+        """
+        Show heat plots of template, filter and response in a live
+        figure. matplotlib is only imported here.
+
+        Parameters
+        ----------
+        interval : float. optional.
+            min time between refreshs of figure in s. default is 0.2.
+
+        Returns
+        -------
+        None.
+
+        """
+        import mossepy.visualization as vis
+        
+        self.addObserver(vis.LiveView(self.valRange, interval))
+        
+    def setOutput(self, level=rw.IMAGES, fmt='jpg', workers=0, depth=16):
+        """
+        Set output of tracking results.
+
+        Parameters
+        ----------
+        level : int. optional.
+            output level, see mossepy.result_writer. POSITIONS writes
+            object positions, PEAKS adds response peak statistics,
+            IMAGES adds template, filter and response. default is IMAGES.
+        fmt : string. optional.
+            output format. 'jpg' writes one .jpg file per frame and image,
+            'npz' writes results to compressed files of 256 frames each,
+            read by mossepy.result_writer.loadNpz.
+            default is 'jpg'.
+        workers : int. optional.
+            number of threads writing .jpg files in background.
+            default is 0, i.e. files are written synchronously.
+        depth : int. optional.
+            max number of frames queued for background writing.
+            default is 16.
+
+        Returns
+        -------
+        None.
+
+        """
+        if fmt == 'jpg':
+            self.writer = rw.JpgWriter(self.outDir, self.valRange, level, workers, depth)
+        elif fmt == 'npz':
+            self.writer = rw.NpzWriter(self.outDir, self.valRange, level)
+        else:
+            raise ValueError('unknown output format: ' + fmt)
         
     def saveResults(self):
         """
-        Save tracking results to files.
+        Save tracking results using the result writer.
 
         Returns
         -------
         None.
 
         """
-        # fit images to valRange for output
-        f = (self.valRange-1)/self.f.max() * self.f
-        g = (self.valRange-1)/self.g.max() * self.g
-        h = (self.valRange-1)/self.h.max() * self.h
+        # spatial filter is only needed for image output
+        if self.writer.level >= rw.IMAGES:
+            self.calSpatialFilter()
+        else:
+            self.h = None
         
-        # define output paths
-        temPath = self.outDir + '/' + self.imgFile[:-4] + '_tem.jpg'
-        filPath = self.outDir + '/' + self.imgFile[:-4] + '_fil.jpg'
-        resPath = self.outDir + '/' + self.imgFile[:-4] + '_res.jpg'
-                
-        # save results to files
-        img.write(temPath, f)
-        img.write(filPath, abs(np.fft.ifftshift(h)))        
-        img.write(resPath, abs(g))
\ No newline at end of file
+        with self.prof.stage('save'):
+            self.writer.write(self.imgFile, self.objPos, self.f, self.g, self.h)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cropping of templates from image frames.
+
+Created on Sat Oct 23 09:21:36 2021
+
+@author: niklas
+"""
+
+
+import numpy as np
+
+
+# weights of RGB channels in grayscale conversion
+GRAY_WEIGHTS = (0.2990, 0.5870, 0.1140)
+
+
+def grayInto(Iin, out, tmp):
+    """
+    Convert RGB or grayscale image array to grayscale in given output.
+
+    Parameters
+    ----------
+    Iin : numpy array
+        RGB or grayscale image array.
+    out : numpy array
+        grayscale output of same height and width.
+    tmp : numpy array
+        temporary array of same shape as out.
+
+    Returns
+    -------
+    None.
+
+    """
+    if Iin.ndim == 2:
+        out[...] = Iin
+
+    else:
+        np.multiply(Iin[:, :, 0], GRAY_WEIGHTS[0], out=out)
+        for k in (1, 2):
+            np.multiply(Iin[:, :, k], GRAY_WEIGHTS[k], out=tmp)
+            out += tmp
+
+
+class Cropper(object):
+    """
+    Crop grayscale templates from RGB or grayscale images into
+    preallocated buffers. Only the cropped region is converted to
+    grayscale. Template parts outside of the image are filled by
+    replicating border pixels or by a constant value. Templates
+    can be cropped at subpixel positions by bilinear interpolation.
+    Optionally, regions of binning times the template size are
+    cropped and averaged over cells of binning x binning pixels.
+    """
+
+    def __init__(self, tempSize, mode='edge', cval=0., dtype=np.float64, binning=1):
+        """
+        constructor of cropper class.
+
+        Parameters
+        ----------
+        tempSize : list of ints
+            vertical and horizontal size of template.
+        mode : string. optional.
+            filling of template parts outside of image, 'edge'
+            replicates border pixels, 'constant' uses cval.
+            default is 'edge'.
+        cval : float. optional.
+            value used in mode 'constant'. default is 0.
+        dtype : numpy dtype. optional.
+            float type of templates. default is float64.
+        binning : int. optional.
+            edge length of cells averaged into one template pixel.
+            default is 1, i.e. no binning.
+
+        Returns
+        -------
+        None.
+
+        """
+        if mode not in ('edge', 'constant'):
+            raise ValueError('unknown crop mode: ' + mode)
+
+        self.tempSize = tempSize
+        self.mode = mode
+        self.cval = cval
+        self.dtype = np.dtype(dtype)
+        self.binning = binning
+
+        # size of cropped region
+        self.cropSize = [tempSize[0] * binning, tempSize[1] * binning]
+
+        shape = (self.cropSize[0], self.cropSize[1])
+        # region and temporary buffers
+        self.buf = np.empty(shape, dtype=self.dtype)
+        self.tmp = np.empty(shape, dtype=self.dtype)
+        # buffers enlarged by one pixel for subpixel cropping
+        bigShape = (shape[0] + 1, shape[1] + 1)
+        self.bigBuf = np.empty(bigShape, dtype=self.dtype)
+        self.bigTmp = np.empty(bigShape, dtype=self.dtype)
+        # binned template
+        if binning > 1:
+            self.binBuf = np.empty((tempSize[0], tempSize[1]), dtype=self.dtype)
+
+    def cropInto(self, I, r0, c0, buf, tmp):
+        """
+        Crop region of buffer size with upper left corner (r0, c0)
+        from image into buffer.
+
+        Parameters
+        ----------
+        I : numpy array
+            RGB or grayscale image.
+        r0 : int
+            first row of region.
+        c0 : int
+            first column of region.
+        buf : numpy array
+            output buffer.
+        tmp : numpy array
+            temporary buffer of same shape.
+
+        Returns
+        -------
+        None.
+
+        """
+        h, w = buf.shape
+
+        # intersection of region and image
+        ir0 = max(r0, 0)
+        ir1 = min(r0 + h, I.shape[0])
+        ic0 = max(c0, 0)
+        ic1 = min(c0 + w, I.shape[1])
+
+        if ir0 >= ir1 or ic0 >= ic1:
+            # region completely outside of image
+            if self.mode == 'constant':
+                buf[...] = self.cval
+            else:
+                rows = np.clip(np.arange(r0, r0 + h), 0, I.shape[0] - 1)
+                cols = np.clip(np.arange(c0, c0 + w), 0, I.shape[1] - 1)
+                grayInto(I[rows[:, None], cols[None, :]], buf, tmp)
+            return
+
+        # intersection in buffer coordinates
+        br0 = ir0 - r0
+        br1 = ir1 - r0
+        bc0 = ic0 - c0
+        bc1 = ic1 - c0
+
+        grayInto(I[ir0:ir1, ic0:ic1], buf[br0:br1, bc0:bc1], tmp[br0:br1, bc0:bc1])
+
+        # fill parts outside of image
+        if br0 > 0 or br1 < h or bc0 > 0 or bc1 < w:
+            if self.mode == 'constant':
+                buf[:br0] = self.cval
+                buf[br1:] = self.cval
+                buf[:, :bc0] = self.cval
+                buf[:, bc1:] = self.cval
+            else:
+                buf[:br0] = buf[br0]
+                buf[br1:] = buf[br1 - 1]
+                buf[:, :bc0] = buf[:, bc0:bc0 + 1]
+                buf[:, bc1:] = buf[:, bc1 - 1:bc1]
+
+    def bin(self, buf):
+        """
+        Average region over cells of binning x binning pixels.
+
+        Parameters
+        ----------
+        buf : numpy array
+            cropped region.
+
+        Returns
+        -------
+        f : numpy array
+            binned template.
+
+        """
+        if self.binning == 1:
+            return buf
+
+        b = self.binning
+        buf.reshape(self.tempSize[0], b, self.tempSize[1], b).sum(axis=(1, 3), out=self.binBuf)
+        self.binBuf *= 1. / b**2
+
+        return self.binBuf
+
+    def crop(self, I, pos):
+        """
+        Crop template centered in given position from image.
+        The returned buffer is overwritten by the next call.
+
+        Parameters
+        ----------
+        I : numpy array
+            RGB or grayscale image.
+        pos : list of ints or floats
+            center position of template.
+
+        Returns
+        -------
+        f : numpy array
+            grayscale template.
+
+        """
+        dx = int(self.cropSize[0]/2)
+        dy = int(self.cropSize[1]/2)
+
+        p0 = np.floor(pos[0])
+        p1 = np.floor(pos[1])
+        a = pos[0] - p0
+        b = pos[1] - p1
+
+        r0 = int(p0) - dx
+        c0 = int(p1) - dy
+
+        if a == 0 and b == 0:
+            self.cropInto(I, r0, c0, self.buf, self.tmp)
+            return self.bin(self.buf)
+
+        # interpolate bilinearly between four shifted templates
+        P = self.bigBuf
+        self.cropInto(I, r0, c0, P, self.bigTmp)
+
+        np.multiply(P[:-1, :-1], (1 - a) * (1 - b), out=self.buf)
+        for shift, weight in (((0, 1), (1 - a) * b),
+                              ((1, 0), a * (1 - b)),
+                              ((1, 1), a * b)):
+            Q = P[shift[0]:shift[0] + self.cropSize[0],
+                  shift[1]:shift[1] + self.cropSize[1]]
+            np.multiply(Q, weight, out=self.tmp)
+            self.buf += self.tmp
+
+        return self.bin(self.buf)
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Feature channels of image frames used by multi-channel trackers.
+
+Channels are extracted in vectorized operations on tiles of frames and
+cached per frame, such that trackers of several objects in the same
+frame share them.
+
+Created on Sat Nov 27 09:36:50 2021
+
+@author: niklas
+"""
+
+
+import numpy as np
+import scipy.ndimage as nd
+
+from mossepy.crop import GRAY_WEIGHTS
+
+
+# available feature kinds
+KINDS = ('gray', 'gradient', 'color')
+
+
+def gradientChannels(gray, nBins=4, cell=4):
+    """
+    Calculate HOG-like channels of gradients projected onto nBins
+    orientations. Unsigned projections are averaged over cells.
+
+    Parameters
+    ----------
+    gray : numpy array
+        grayscale image.
+    nBins : int. optional.
+        number of orientations. default is 4.
+    cell : int. optional.
+        edge length of averaging cells. default is 4.
+
+    Returns
+    -------
+    channels : numpy array
+        gradient channels of shape (nBins, H, W).
+
+    """
+    gr, gc = np.gradient(gray)
+
+    # unsigned projections onto orientations in [0, pi)
+    ang = np.pi * np.arange(nBins) / nBins
+    channels = np.empty((nBins,) + gray.shape, dtype=gray.dtype)
+    for b in range(nBins):
+        np.multiply(gc, np.cos(ang[b]), out=channels[b])
+        channels[b] += np.sin(ang[b]) * gr
+        np.abs(channels[b], out=channels[b])
+
+    if cell > 1:
+        channels = nd.uniform_filter1d(channels, cell, axis=1, mode='nearest')
+        channels = nd.uniform_filter1d(channels, cell, axis=2, mode='nearest')
+
+    return channels
+
+
+class FeatureExtractor(object):
+    """
+    Extract stacks of feature channels from frames. Channels are
+    calculated lazily in tiles of the frame, when they are cropped
+    first, and cached until the next frame. Frames are told apart by
+    keys, e.g. frame name and number, as sources may decode frames
+    into reused buffers. Trackers of several objects share tiles by
+    sharing the extractor.
+    """
+
+    def __init__(self, kinds=('gray', 'gradient'), nBins=4, cell=4, tile=64, dtype=np.float64):
+        """
+        constructor of feature extractor class.
+
+        Parameters
+        ----------
+        kinds : tuple of strings. optional.
+            feature kinds, 'gray' (1 channel), 'gradient' (nBins
+            channels) and 'color' (3 channels, RGB frames only).
+            default is ('gray', 'gradient').
+        nBins : int. optional.
+            number of gradient orientations. default is 4.
+        cell : int. optional.
+            edge length of gradient averaging cells. default is 4.
+        tile : int. optional.
+            edge length of tiles. default is 64.
+        dtype : numpy dtype. optional.
+            float type of channels. default is float64.
+
+        Returns
+        -------
+        None.
+
+        """
+        for kind in kinds:
+            if kind not in KINDS:
+                raise ValueError('unknown feature kind: ' + kind)
+
+        self.kinds = kinds
+        self.nBins = nBins
+        self.cell = cell
+        self.tile = tile
+        self.dtype = np.dtype(dtype)
+
+        self.nChannels = sum({'gray': 1, 'gradient': nBins, 'color': 3}[kind]
+                             for kind in kinds)
+        # margin of tiles needed by gradient and cell averaging
+        self.halo = cell + 1 if 'gradient' in kinds else 0
+
+        # current frame, its key, its channels and calculated tiles
+        self.frame = None
+        self.key = None
+        self.channels = None
+        self.done = None
+
+    def reset(self):
+        """
+        Discard cached channels. Next frame is processed anew.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.frame = None
+        self.key = None
+
+    def setFrame(self, I, key=None):
+        """
+        Set current frame. Cached channels are discarded,
+        if key differs from key of current frame.
+
+        Parameters
+        ----------
+        I : numpy array
+            RGB or grayscale frame.
+        key : hashable. optional.
+            key of frame, e.g. frame name and number. default is None,
+            i.e. frames are told apart by identity, which fails for
+            frames decoded into reused buffers.
+
+        Returns
+        -------
+        None.
+
+        """
+        if key is None:
+            key = ('id', id(I))
+
+        if key == self.key and self.frame is not None:
+            # frame may be held in another buffer of same content
+            self.frame = I
+            return
+
+        if 'color' in self.kinds and I.ndim == 2:
+            raise ValueError('color features need RGB frames')
+
+        H, W = I.shape[:2]
+        self.frame = I
+        self.key = key
+        if self.channels is None or self.channels.shape[1:] != (H, W):
+            self.channels = np.empty((self.nChannels, H, W), dtype=self.dtype)
+        self.done = np.zeros((-(-H // self.tile), -(-W // self.tile)), dtype=bool)
+
+    def fillValues(self, cval):
+        """
+        Get values of channels outside of frames filled by constant.
+        Gray and color channels take the constant, gradient channels
+        of a constant are zero.
+
+        Parameters
+        ----------
+        cval : float
+            fill value of frame.
+
+        Returns
+        -------
+        fill : numpy array
+            fill value per channel.
+
+        """
+        fill = []
+        for kind in self.kinds:
+            if kind == 'gray':
+                fill += [cval]
+            elif kind == 'gradient':
+                fill += [0.] * self.nBins
+            else:
+                fill += [cval] * 3
+
+        return np.array(fill, dtype=self.dtype)
+
+    def calRegion(self, r0, r1, c0, c1):
+        """
+        Calculate channels of region of current frame.
+
+        Parameters
+        ----------
+        r0, r1 : int
+            first and behind last row of region.
+        c0, c1 : int
+            first and behind last column of region.
+
+        Returns
+        -------
+        None.
+
+        """
+        I = self.frame
+        H, W = I.shape[:2]
+
+        # region enlarged by halo, within frame
+        e0 = max(r0 - self.halo, 0)
+        e1 = min(r1 + self.halo, H)
+        f0 = max(c0 - self.halo, 0)
+        f1 = min(c1 + self.halo, W)
+        block = I[e0:e1, f0:f1]
+        inner = (slice(r0 - e0, r1 - e0), slice(c0 - f0, c1 - f0))
+
+        if block.ndim == 2:
+            gray = block.astype(self.dtype)
+        else:
+            gray = np.dot(block[:, :, :3], np.array(GRAY_WEIGHTS, dtype=self.dtype))
+
+        k = 0
+        for kind in self.kinds:
+            if kind == 'gray':
+                self.channels[k, r0:r1, c0:c1] = gray[inner]
+                k += 1
+            elif kind == 'gradient':
+                grad = gradientChannels(gray, self.nBins, self.cell)
+                self.channels[k:k + self.nBins, r0:r1, c0:c1] = grad[(slice(None),) + inner]
+                k += self.nBins
+            else:
+                self.channels[k:k + 3, r0:r1, c0:c1] = np.moveaxis(block[inner + (slice(0, 3),)], -1, 0)
+                k += 3
+
+    def ensure(self, r0, r1, c0, c1):
+        """
+        Calculate all missing tiles overlapping region of current frame.
+
+        Parameters
+        ----------
+        r0, r1 : int
+            first and behind last row of region.
+        c0, c1 : int
+            first and behind last column of region.
+
+        Returns
+        -------
+        None.
+
+        """
+        t = self.tile
+        tr0, tr1 = r0 // t, -(-r1 // t)
+        tc0, tc1 = c0 // t, -(-c1 // t)
+
+        if self.done[tr0:tr1, tc0:tc1].all():
+            return
+
+        H, W = self.frame.shape[:2]
+        self.calRegion(tr0 * t, min(tr1 * t, H), tc0 * t, min(tc1 * t, W))
+        self.done[tr0:tr1, tc0:tc1] = True
+
+    def extract(self, I, key=None):
+        """
+        Extract feature channels of whole frame.
+
+        Parameters
+        ----------
+        I : numpy array
+            RGB or grayscale frame.
+        key : hashable. optional.
+            key of frame, see setFrame. default is None.
+
+        Returns
+        -------
+        channels : numpy array
+            feature channels of shape (nChannels, H, W).
+
+        """
+        self.setFrame(I, key)
+        self.ensure(0, I.shape[0], 0, I.shape[1])
+
+        return self.channels
+
+    def crop(self, I, pos, tempSize, key=None, mode='edge', cval=0.):
+        """
+        Crop feature channels centered in given position. Parts outside
+        of the frame are filled according to crop mode.
+
+        Parameters
+        ----------
+        I : numpy array
+            RGB or grayscale frame.
+        pos : list of ints
+            center position of template.
+        tempSize : list of ints
+            vertical and horizontal size of template.
+        key : hashable. optional.
+            key of frame, see setFrame. default is None.
+        mode : string. optional.
+            'edge' replicates border pixels, 'constant' fills the frame
+            with cval before channels are taken. default is 'edge'.
+        cval : float. optional.
+            value used in mode 'constant'. default is 0.
+
+        Returns
+        -------
+        x : numpy array
+            feature template of shape (nChannels, H, W).
+
+        """
+        if mode not in ('edge', 'constant'):
+            raise ValueError('unknown crop mode: ' + mode)
+
+        self.setFrame(I, key)
+
+        rows = np.arange(tempSize[0]) + pos[0] - int(tempSize[0]/2)
+        cols = np.arange(tempSize[1]) + pos[1] - int(tempSize[1]/2)
+        inRows = (rows >= 0) & (rows < I.shape[0])
+        inCols = (cols >= 0) & (cols < I.shape[1])
+        rows = np.clip(rows, 0, I.shape[0] - 1)
+        cols = np.clip(cols, 0, I.shape[1] - 1)
+        self.ensure(rows[0], rows[-1] + 1, cols[0], cols[-1] + 1)
+
+        x = self.channels[:, rows[:, None], cols[None, :]]
+
+        if mode == 'constant' and not (inRows.all() and inCols.all()):
+            outside = ~(inRows[:, None] & inCols[None, :])
+            x[:, outside] = self.fillValues(cval)[:, None]
+
+        return x
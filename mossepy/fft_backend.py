@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exchangeable FFT backends used by the correlation trackers.
+
+All transforms act on the last two axes, such that stacks of
+templates can be transformed in a single call. Real input is
+transformed to half spectra by rfft2 and back again by irfft2.
+
+Created on Sun Sep 19 15:03:22 2021
+
+@author: niklas
+"""
+
+
+import os
+
+import numpy as np
+import scipy.fft as sfft
+
+# pyFFTW is optional
+try:
+    import pyfftw
+    import pyfftw.builders
+except ImportError:
+    pyfftw = None
+
+
+def keepPrecision(a, A):
+    """
+    Cast transform to single precision, if input is single precision.
+    numpy.fft before numpy 2.0 always transforms in double precision.
+
+    Parameters
+    ----------
+    a : numpy array
+        input of transform.
+    A : numpy array
+        output of transform.
+
+    Returns
+    -------
+    A : numpy array
+        output of transform in precision of input.
+
+    """
+    if a.dtype in (np.float32, np.complex64):
+        if A.dtype == np.complex128:
+            A = A.astype(np.complex64)
+        elif A.dtype == np.float64:
+            A = A.astype(np.float32)
+
+    return A
+
+
+class NumpyFFT(object):
+    """
+    FFT backend using numpy.fft. Reference backend.
+    """
+
+    name = 'numpy'
+
+    def rfft2(self, a):
+        """
+        2D FFT of real input over last two axes.
+
+        Parameters
+        ----------
+        a : numpy array
+            real input array.
+
+        Returns
+        -------
+        A : numpy array
+            half spectrum of input.
+
+        """
+        return keepPrecision(a, np.fft.rfft2(a, axes=(-2, -1)))
+
+    def irfft2(self, A, s):
+        """
+        inverse 2D FFT of half spectrum over last two axes.
+
+        Parameters
+        ----------
+        A : numpy array
+            half spectrum.
+        s : list of ints
+            vertical and horizontal size of real output.
+
+        Returns
+        -------
+        a : numpy array
+            real output array.
+
+        """
+        return keepPrecision(A, np.fft.irfft2(A, s=s, axes=(-2, -1)))
+
+    def fft2(self, a):
+        """
+        2D FFT over last two axes.
+
+        Parameters
+        ----------
+        a : numpy array
+            input array.
+
+        Returns
+        -------
+        A : numpy array
+            spectrum of input.
+
+        """
+        return keepPrecision(a, np.fft.fft2(a, axes=(-2, -1)))
+
+    def ifft2(self, A):
+        """
+        inverse 2D FFT over last two axes.
+
+        Parameters
+        ----------
+        A : numpy array
+            spectrum.
+
+        Returns
+        -------
+        a : numpy array
+            output array.
+
+        """
+        return keepPrecision(A, np.fft.ifft2(A, axes=(-2, -1)))
+
+
+class ScipyFFT(NumpyFFT):
+    """
+    FFT backend using scipy.fft, optionally multithreaded.
+    """
+
+    name = 'scipy'
+
+    def __init__(self, workers=None):
+        """
+        constructor of scipy FFT backend.
+
+        Parameters
+        ----------
+        workers : int. optional.
+            number of threads used per transform.
+            default is None, i.e. single threaded.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.workers = workers
+
+    def rfft2(self, a):
+        return sfft.rfft2(a, axes=(-2, -1), workers=self.workers)
+
+    def irfft2(self, A, s):
+        return sfft.irfft2(A, s=s, axes=(-2, -1), workers=self.workers)
+
+    def fft2(self, a):
+        return sfft.fft2(a, axes=(-2, -1), workers=self.workers)
+
+    def ifft2(self, A):
+        return sfft.ifft2(A, axes=(-2, -1), workers=self.workers)
+
+
+class FFTWFFT(NumpyFFT):
+    """
+    FFT backend using pyFFTW. Plans are created once per
+    transform type, shape and data type and reused afterwards.
+    """
+
+    name = 'pyfftw'
+
+    def __init__(self, workers=None, effort='FFTW_MEASURE'):
+        """
+        constructor of pyFFTW backend.
+
+        Parameters
+        ----------
+        workers : int. optional.
+            number of threads used per transform.
+            default is None, i.e. single threaded.
+        effort : string. optional.
+            FFTW planner effort. default is 'FFTW_MEASURE'.
+
+        Returns
+        -------
+        None.
+
+        """
+        if pyfftw is None:
+            raise ImportError('pyfftw backend requested, but pyfftw is not installed')
+
+        self.workers = 1 if workers is None else workers
+        self.effort = effort
+        # plans keyed by transform, shape, dtype and output size
+        self.plans = {}
+
+    def _plan(self, kind, a, s=None):
+        """
+        get cached plan for transform of given array.
+
+        Parameters
+        ----------
+        kind : string
+            name of transform in pyfftw.builders.
+        a : numpy array
+            input array.
+        s : list of ints. optional.
+            output size of inverse real transforms. default is None.
+
+        Returns
+        -------
+        plan : pyfftw.FFTW
+            FFTW object transforming arrays like a.
+
+        """
+        key = (kind, a.shape, a.dtype.str, None if s is None else tuple(s))
+
+        if key not in self.plans:
+            builder = getattr(pyfftw.builders, kind)
+            kwargs = {} if s is None else {'s': s}
+            self.plans[key] = builder(pyfftw.empty_aligned(a.shape, a.dtype),
+                                      axes=(-2, -1),
+                                      threads=self.workers,
+                                      planner_effort=self.effort,
+                                      **kwargs)
+
+        return self.plans[key]
+
+    def rfft2(self, a):
+        # output buffer of plan is reused, so return a copy
+        return self._plan('rfft2', a)(a).copy()
+
+    def irfft2(self, A, s):
+        return self._plan('irfft2', A, s)(A).copy()
+
+    def fft2(self, a):
+        return self._plan('fft2', a)(a).copy()
+
+    def ifft2(self, A):
+        return self._plan('ifft2', A)(A).copy()
+
+
+# available backends by name
+BACKENDS = {
+    NumpyFFT.name: NumpyFFT,
+    ScipyFFT.name: ScipyFFT,
+    FFTWFFT.name: FFTWFFT,
+    }
+
+
+def getBackend(backend='numpy', workers=None):
+    """
+    get FFT backend by name. Backend objects are passed through.
+
+    Parameters
+    ----------
+    backend : string or backend object. optional.
+        'numpy', 'scipy' or 'pyfftw'. default is 'numpy'.
+    workers : int. optional.
+        number of threads used per transform, if supported by backend.
+        -1 uses all CPUs. default is None.
+
+    Returns
+    -------
+    backend : backend object
+        FFT backend.
+
+    """
+    if not isinstance(backend, str):
+        return backend
+
+    if backend not in BACKENDS:
+        raise ValueError('unknown FFT backend: ' + backend)
+
+    if backend == NumpyFFT.name:
+        return NumpyFFT()
+
+    if backend == FFTWFFT.name and workers == -1:
+        workers = os.cpu_count()
+
+    return BACKENDS[backend](workers)
+
+
+def fastSize(size):
+    """
+    get next sizes of fast real FFTs, i.e. products of 2, 3 and 5,
+    not smaller than given size.
+
+    Parameters
+    ----------
+    size : list of ints
+        vertical and horizontal size.
+
+    Returns
+    -------
+    fast : list of ints
+        vertical and horizontal fast FFT size.
+
+    """
+    return [sfft.next_fast_len(int(n), real=True) for n in size]
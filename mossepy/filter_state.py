@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Frequency domain state of correlation filters.
+
+Created on Sat Sep 18 10:12:31 2021
+
+@author: niklas
+"""
+
+
+import numpy as np
+
+import mossepy.utils as utils
+from mossepy.preprocess import getWindow
+
+
+# constant arrays shared by all filters of equal template size and
+# optimal response, keyed by (valRange, tempSize, sigma)
+_constCache = {}
+
+
+def getConstants(valRange, tempSize, sigma, dtype=np.float64):
+    """
+    Get Hanning window, optimal response and its spectrum for
+    given template size. Arrays are calculated once and cached.
+
+    Parameters
+    ----------
+    valRange : int
+        image value range.
+    tempSize : list of ints
+        vertical and horizontal size of template.
+    sigma : list of floats
+        standard deviations of optimal filter response.
+    dtype : numpy dtype. optional.
+        float type of arrays. default is float64.
+
+    Returns
+    -------
+    win : numpy array
+        2D Hanning window.
+    g : numpy array
+        optimal response, 2D Gaussian centered in template.
+    G : numpy array
+        half spectrum of optimal response.
+
+    """
+    dtype = np.dtype(dtype)
+    key = (valRange, tuple(tempSize), tuple(sigma), dtype.str)
+
+    if key not in _constCache:
+        win = getWindow(tempSize, dtype)
+
+        # optimal position of target is in center of template window
+        optPos = [int(tempSize[0]/2), int(tempSize[1]/2)]
+        g = utils.gauss2D(valRange, tempSize, optPos, sigma)
+        # transform in double precision before casting
+        G = np.fft.rfft2(g).astype(np.result_type(dtype, np.complex64))
+        g = g.astype(dtype)
+
+        # cached arrays are shared, so protect them against changes
+        for arr in (g, G):
+            arr.setflags(write=False)
+
+        _constCache[key] = (win, g, G)
+
+    return _constCache[key]
+
+
+class FilterState(object):
+    """
+    Frequency domain state of a correlation filter.
+
+    Holds the cached per-template constants and the filter spectra,
+    such that tracking needs no transforms of the filter itself.
+    Spectra are half spectra of real input.
+    """
+
+    def __init__(self, valRange, tempSize, sigma, fft, dtype=np.float64):
+        """
+        Constructor of filter state class.
+
+        Parameters
+        ----------
+        valRange : int
+            image value range.
+        tempSize : list of ints
+            vertical and horizontal size of template.
+        sigma : list of floats
+            standard deviations of optimal filter response.
+        fft : backend object
+            FFT backend.
+        dtype : numpy dtype. optional.
+            float type of filter. spectra are of corresponding
+            complex type. default is float64.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.tempSize = tempSize
+        self.fft = fft
+        self.win, self.g, self.G = getConstants(valRange, tempSize, sigma, dtype)
+
+        # numerator and denominator of filter
+        self.A = None
+        self.B = None
+        # conjugate filter spectrum A/B
+        self.conjH = None
+        # number of filter changes, e.g. to invalidate derived spectra
+        self.version = 0
+
+    def setSpectra(self, A, B):
+        """
+        Set numerator and denominator of filter and
+        update conjugate filter spectrum.
+
+        Parameters
+        ----------
+        A : numpy array
+            numerator of filter.
+        B : numpy array
+            real denominator of filter.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.A = A
+        self.B = B
+        self.conjH = A / B
+        self.version += 1
+
+    def respond(self, F):
+        """
+        Correlate template spectrum with filter.
+
+        Parameters
+        ----------
+        F : numpy array
+            spectrum of template.
+
+        Returns
+        -------
+        G : numpy array
+            spectrum of response.
+
+        """
+        return F * self.conjH
+
+    def spatial(self):
+        """
+        Transform filter to spatial domain. Only needed for output.
+
+        Returns
+        -------
+        h : numpy array
+            spatial filter.
+
+        """
+        return self.fft.irfft2(np.conj(self.conjH), self.tempSize)
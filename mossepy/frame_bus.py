@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Distribution of frames of a single stream to several tracker processes.
+
+A producer decodes each frame once and publishes it into a ring buffer
+in shared memory. Consumers in other processes attach to the ring by
+name and read frames as read-only numpy views without copying or
+pickling. Each consumer acknowledges a frame, when it requests the
+next one. A slot is overwritten only after all attached consumers
+have acknowledged its frame, such that the slowest consumer throttles
+the producer. Consumers store their process ids on attaching, such
+that producer and consumers detect a dead peer instead of waiting
+for it forever.
+
+One shared memory block holds a header, the acknowledged frame counts
+and process ids of consumers, the names of frames in the slots and
+the slots:
+
+    | header | acks | pids | names | slots |
+
+Counters are polled, so no locks have to be shared between processes.
+
+Created on Sat Dec 11 10:02:18 2021
+
+@author: niklas
+"""
+
+
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from mossepy.frame_source import FrameSource, toSource
+
+
+# fields of header
+HEADER = np.dtype([('head', '<i8'),         # number of published frames
+                   ('closed', '<i8'),       # 1, if stream has ended
+                   ('slots', '<i8'),        # number of slots of ring
+                   ('consumers', '<i8'),    # number of consumers
+                   ('producer', '<i8'),     # process id of producer
+                   ('ndim', '<i8'),         # frame shape
+                   ('shape', '<i8', (3,)),
+                   ('dtype', 'S16')])       # frame data type
+
+# frame names, truncated to 64 bytes
+NAME = np.dtype('S64')
+
+# acknowledged count of consumers, which have detached
+DETACHED = -1
+
+
+def _align(n, k=64):
+    return -(-n // k) * k
+
+
+def _layout(slots, consumers, frameBytes):
+    """
+    Get offsets of acks, pids, names and slots and total size of block.
+    """
+    acks = _align(HEADER.itemsize)
+    pids = _align(acks + 8 * consumers)
+    names = _align(pids + 8 * consumers)
+    frames = _align(names + NAME.itemsize * slots)
+
+    return acks, pids, names, frames, frames + slots * _align(frameBytes)
+
+
+def _alive(pid):
+    """
+    Check, if process exists and has not terminated. Processes are
+    assumed to be alive, where this can not be checked (Windows).
+    """
+    if os.name != 'posix':
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    # terminated children stay zombies, until they are joined
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except (OSError, IndexError):
+        return True
+
+
+def _attach(name):
+    """
+    Attach to existing shared memory block. Block is not tracked by
+    attaching process, if supported (Python >= 3.13).
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _views(shm):
+    """
+    Get numpy views of header, acks, pids, names and slots of block.
+    """
+    header = np.ndarray(1, dtype=HEADER, buffer=shm.buf)[0]
+
+    slots = int(header['slots'])
+    consumers = int(header['consumers'])
+    shape = tuple(int(n) for n in header['shape'][:header['ndim']])
+    dtype = np.dtype(header['dtype'].decode())
+    frameBytes = int(np.prod(shape)) * dtype.itemsize
+
+    acks, pids, names, frames, _ = _layout(slots, consumers, frameBytes)
+    ackView = np.ndarray(consumers, dtype='<i8', buffer=shm.buf, offset=acks)
+    pidView = np.ndarray(consumers, dtype='<i8', buffer=shm.buf, offset=pids)
+    nameView = np.ndarray(slots, dtype=NAME, buffer=shm.buf, offset=names)
+    frameView = np.ndarray((slots,) + shape, dtype=dtype, buffer=shm.buf, offset=frames,
+                           strides=(_align(frameBytes),) + np.empty(shape, dtype).strides)
+
+    return header, ackView, pidView, nameView, frameView
+
+
+class FrameBus(object):
+    """
+    Producer of a shared memory frame ring. Frames are published in
+    order and read by a fixed number of consumers via BusSource.
+
+    While waiting for consumers, the producer raises an error naming
+    the consumer, if it has terminated without detaching, e.g. when
+    it was killed, or if it has not attached within attachTimeout.
+    """
+
+    def __init__(self, shape, dtype='uint8', slots=8, consumers=1, name=None, poll=1e-4,
+                 attachTimeout=60.):
+        """
+        constructor of frame bus class. Allocates shared memory block.
+
+        Parameters
+        ----------
+        shape : list of ints
+            shape of frames, e.g. [480, 640, 3].
+        dtype : string or numpy dtype. optional.
+            data type of frames. default is 'uint8'.
+        slots : int. optional.
+            number of frames in ring. default is 8.
+        consumers : int. optional.
+            number of consumers. default is 1.
+        name : string. optional.
+            name of shared memory block. default is None, i.e. unique name.
+        poll : float. optional.
+            polling interval in s, while waiting for consumers.
+            default is 1e-4.
+        attachTimeout : float. optional.
+            max waiting time in s for consumers, which have not attached,
+            yet. None waits without limit. default is 60.
+
+        Returns
+        -------
+        None.
+
+        """
+        if len(shape) > 3:
+            raise ValueError('frames have to be of 2 or 3 dimensions')
+
+        dtype = np.dtype(dtype)
+        frameBytes = int(np.prod(shape)) * dtype.itemsize
+        size = _layout(slots, consumers, frameBytes)[4]
+
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = self.shm.name
+        self.poll = poll
+        self.attachTimeout = attachTimeout
+
+        header = np.ndarray(1, dtype=HEADER, buffer=self.shm.buf)
+        header[0] = (0, 0, slots, consumers, os.getpid(), len(shape),
+                     tuple(shape) + (0,) * (3 - len(shape)), dtype.str)
+
+        self.header, self.acks, self.pids, self.names, self.frames = _views(self.shm)
+        self.acks[:] = 0
+        self.pids[:] = 0
+
+    def checkConsumers(self, waited):
+        """
+        Check consumers, which have not acknowledged all frames.
+
+        Parameters
+        ----------
+        waited : float
+            waiting time in s so far.
+
+        Returns
+        -------
+        None.
+
+        """
+        for k in np.flatnonzero((self.acks != DETACHED) & (self.acks < self.header['head'])):
+            pid = int(self.pids[k])
+
+            if pid == 0:
+                if self.attachTimeout is not None and waited > self.attachTimeout:
+                    raise TimeoutError('consumer ' + str(k) + ' did not attach to frame bus')
+            elif not _alive(pid):
+                raise RuntimeError('consumer ' + str(k) + ' (pid ' + str(pid) +
+                                   ') terminated without detaching from frame bus')
+
+    def waitFor(self, cond, timeout):
+        """
+        Poll until condition is met. Consumers are checked meanwhile.
+        """
+        start = time.perf_counter()
+
+        while not cond():
+            waited = time.perf_counter() - start
+            if timeout is not None and waited > timeout:
+                raise TimeoutError('consumers of frame bus did not acknowledge')
+            self.checkConsumers(waited)
+            time.sleep(self.poll)
+
+    def free(self):
+        """
+        Check, if next slot is acknowledged by all attached consumers.
+        """
+        acks = self.acks[self.acks != DETACHED]
+
+        return len(acks) == 0 or self.header['head'] - acks.min() < len(self.frames)
+
+    def publish(self, name, frame, timeout=None):
+        """
+        Copy frame into next slot of ring. Blocks, while the slot
+        holds a frame not acknowledged by all attached consumers.
+
+        Parameters
+        ----------
+        name : string
+            frame name.
+        frame : numpy array
+            frame of shape of bus.
+        timeout : float. optional.
+            max waiting time in s. default is None, i.e. no limit
+            for consumers alive.
+
+        Returns
+        -------
+        None.
+
+        """
+        if frame.shape != self.frames.shape[1:]:
+            raise ValueError('frame shape does not match frame bus')
+
+        self.waitFor(self.free, timeout)
+
+        k = self.header['head'] % len(self.frames)
+        self.frames[k] = frame
+        self.names[k] = name.encode()[:NAME.itemsize]
+
+        # frame is visible to consumers after counter is increased
+        self.header['head'] += 1
+
+    def publishAll(self, frames, timeout=None):
+        """
+        Publish all frames of source and close stream. The stream is
+        also closed, if publishing fails.
+
+        Parameters
+        ----------
+        frames : frame source, sequence or numpy array
+            frames to be published.
+        timeout : float. optional.
+            max waiting time per frame in s. default is None, i.e. no
+            limit for consumers alive.
+
+        Returns
+        -------
+        n : int
+            number of published frames.
+
+        """
+        try:
+            for name, frame in toSource(frames):
+                self.publish(name, frame, timeout)
+        finally:
+            # remaining consumers stop, also if a consumer failed
+            self.close()
+
+        return int(self.header['head'])
+
+    def close(self):
+        """
+        Mark end of stream. Consumers stop after the last frame.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.header['closed'] = 1
+
+    def wait(self, timeout=None):
+        """
+        Wait until all attached consumers acknowledged all frames.
+
+        Parameters
+        ----------
+        timeout : float. optional.
+            max waiting time in s. default is None, i.e. no limit
+            for consumers alive.
+
+        Returns
+        -------
+        None.
+
+        """
+        def done():
+            acks = self.acks[self.acks != DETACHED]
+            return len(acks) == 0 or acks.min() >= self.header['head']
+
+        self.waitFor(done, timeout)
+
+    def release(self):
+        """
+        Release shared memory block. Consumers have to be finished.
+
+        Returns
+        -------
+        None.
+
+        """
+        # views have to be dropped, before block can be closed
+        self.header = self.acks = self.pids = self.names = self.frames = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class BusSource(FrameSource):
+    """
+    Frames read from frame bus by a single consumer. Frames are yielded
+    as read-only views into shared memory, which stay valid until the
+    next frame is requested. Sources are picklable and attach to the
+    bus on iteration, i.e. in the consumer process.
+
+    Consumers started without multiprocessing share no resource tracker
+    with the producer. Before Python 3.13, their tracker releases the
+    block, when they exit. Consumers stop with an error, if the
+    producer terminates before closing the stream.
+    """
+
+    def __init__(self, busName, consumer, poll=1e-4, timeout=None):
+        """
+        constructor of bus source.
+
+        Parameters
+        ----------
+        busName : string
+            name of frame bus, i.e. FrameBus.name.
+        consumer : int
+            index of consumer, less than number of consumers of bus.
+        poll : float. optional.
+            polling interval in s, while waiting for frames.
+            default is 1e-4.
+        timeout : float. optional.
+            max waiting time per frame in s. default is None, i.e. no limit.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.busName = busName
+        self.consumer = consumer
+        self.poll = poll
+        self.timeout = timeout
+
+    def __iter__(self):
+        shm = _attach(self.busName)
+        header, acks, pids, names, frames = _views(shm)
+        frames.setflags(write=False)
+
+        k = self.consumer
+        if not 0 <= k < len(acks):
+            raise ValueError('invalid consumer index: ' + str(k))
+        if acks[k] == DETACHED:
+            raise ValueError('consumer has already detached: ' + str(k))
+
+        pids[k] = os.getpid()
+        producer = int(header['producer'])
+
+        try:
+            i = int(acks[k])
+
+            while True:
+                # wait for next frame or end of stream
+                start = time.perf_counter()
+                while header['head'] <= i and not header['closed']:
+                    if self.timeout is not None and time.perf_counter() - start > self.timeout:
+                        raise TimeoutError('no frame published on frame bus')
+                    if not _alive(producer):
+                        raise RuntimeError('producer of frame bus terminated '
+                                           'before closing stream')
+                    time.sleep(self.poll)
+
+                if header['head'] <= i:
+                    break
+
+                s = i % len(frames)
+                yield names[s].decode(), frames[s]
+
+                # acknowledge frame, when next one is requested
+                i += 1
+                acks[k] = i
+
+        finally:
+            acks[k] = DETACHED
+            del header, acks, pids, names, frames
+            try:
+                shm.close()
+            except BufferError:
+                # last frame is still referenced, block is closed
+                # when it is garbage collected
+                pass
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sources of image frames fed to the trackers.
+
+Each source is iterable and yields pairs of frame name and frame
+as numpy array. Names are used for naming output files.
+
+Created on Sun Sep 26 14:20:47 2021
+
+@author: niklas
+"""
+
+
+import os
+
+from PIL import Image
+import numpy as np
+
+import mossepy.image as img
+
+
+def frameName(i):
+    """
+    Default name of i-th frame, counted from 1.
+
+    Parameters
+    ----------
+    i : int
+        frame number.
+
+    Returns
+    -------
+    name : string
+        frame name.
+
+    """
+    return 'frame%04d' % i
+
+
+class FrameSource(object):
+    """
+    Basic frame source class.
+
+    Iteration has to be done in inherited class.
+    """
+
+    def __iter__(self):
+        raise NotImplementedError
+
+
+class DirectorySource(FrameSource):
+    """
+    Read image files from directory in alphanumerical order.
+    """
+
+    def __init__(self, inDir, exts=None, prefetch=0, workers=2, gray=False):
+        """
+        constructor of directory source.
+
+        Parameters
+        ----------
+        inDir : string
+            input directory.
+        exts : list of strings. optional.
+            file extensions to be read, e.g. ['.jpg'].
+            default is None, i.e. all image formats known to PIL.
+        prefetch : int. optional.
+            number of frames decoded ahead in background threads.
+            default is 0, i.e. frames are decoded on demand.
+        workers : int. optional.
+            number of decoding threads used for prefetching. default is 2.
+        gray : bool. optional.
+            if True, frames are converted to grayscale on decoding.
+            default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.inDir = inDir
+        self.prefetch = prefetch
+        self.workers = workers
+        self.gray = gray
+
+        if exts is None:
+            exts = Image.registered_extensions().keys()
+        self.exts = tuple(ext.lower() for ext in exts)
+
+    def __iter__(self):
+        imgFiles = [imgFile for imgFile in sorted(os.listdir(self.inDir))
+                    if imgFile.lower().endswith(self.exts)]
+        paths = [self.inDir + '/' + imgFile for imgFile in imgFiles]
+        
+        if self.prefetch > 0:
+            frames = img.prefetch(paths, self.prefetch, self.workers, self.gray)
+        else:
+            frames = (img.read(path, self.gray) for path in paths)
+            
+        for imgFile, frame in zip(imgFiles, frames):
+            yield imgFile, frame
+
+
+class ArraySource(FrameSource):
+    """
+    Frames from array in memory, i.e. a sequence of frames
+    or an array with frames along first axis.
+    """
+
+    def __init__(self, frames, names=None):
+        """
+        constructor of array source.
+
+        Parameters
+        ----------
+        frames : sequence or numpy array
+            frames to be tracked.
+        names : list of strings. optional.
+            frame names. default is None, i.e. numbered names.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.frames = frames
+        self.names = names
+
+    def __iter__(self):
+        for i, frame in enumerate(self.frames):
+            if self.names is None:
+                name = frameName(i + 1)
+            else:
+                name = self.names[i]
+
+            yield name, frame
+
+
+class MemmapSource(ArraySource):
+    """
+    Frames memory mapped from .npy file or raw video file.
+    Frames are read lazily, only when yielded.
+    """
+
+    def __init__(self, path, shape=None, dtype='uint8', offset=0):
+        """
+        constructor of memory mapped source.
+
+        Parameters
+        ----------
+        path : string
+            path of .npy file or raw video file.
+        shape : list of ints. optional.
+            shape of single frame in raw file, e.g. [512, 512, 3].
+            ignored for .npy files. default is None.
+        dtype : string. optional.
+            data type of raw file. default is 'uint8'.
+        offset : int. optional.
+            header size of raw file in bytes. default is 0.
+
+        Returns
+        -------
+        None.
+
+        """
+        if path.endswith('.npy'):
+            frames = np.load(path, mmap_mode='r')
+
+        else:
+            if shape is None:
+                raise ValueError('frame shape needed for raw video file')
+            frames = np.memmap(path, dtype=dtype, mode='r', offset=offset)
+            frames = frames.reshape((-1,) + tuple(shape))
+
+        ArraySource.__init__(self, frames)
+
+
+class CallbackSource(FrameSource):
+    """
+    Frames returned by user callback, e.g. a video decoder.
+    """
+
+    def __init__(self, callback):
+        """
+        constructor of callback source.
+
+        Parameters
+        ----------
+        callback : function
+            returns next frame as numpy array or None,
+            if there are no more frames.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.callback = callback
+
+    def __iter__(self):
+        i = 0
+        frame = self.callback()
+
+        while frame is not None:
+            i += 1
+            yield frameName(i), frame
+            frame = self.callback()
+
+
+def toSource(frames):
+    """
+    Wrap frames into frame source, if not done, yet.
+
+    Parameters
+    ----------
+    frames : frame source, sequence or numpy array
+        frames to be tracked.
+
+    Returns
+    -------
+    source : frame source
+        iterable of frame names and frames.
+
+    """
+    if isinstance(frames, FrameSource):
+        return frames
+
+    return ArraySource(frames)
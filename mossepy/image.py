@@ -9,11 +9,14 @@ Created on Thu Nov 19 11:29:31 2020
 """
 
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 from PIL import Image
 import numpy as np
 
 
-def read(filename):
+def read(filename, gray=False, reduce=1):
     """
     Read image file and convert it to numpy array.
 
@@ -21,6 +24,12 @@ def read(filename):
     ----------
     filename : str
         name of image file to be read.
+    gray : bool. optional.
+        if True, image is converted to grayscale on decoding.
+        JPEG files are decoded to luminance directly. default is False.
+    reduce : int. optional.
+        factor of downscaling on decoding, one of 1, 2, 4, 8.
+        JPEG files are downscaled by the decoder. default is 1.
 
     Returns
     -------
@@ -32,6 +41,19 @@ def read(filename):
     # check, if filename can be found
     try:
         _PILFrame = Image.open(filename)
+        
+        if gray or reduce > 1:
+            # let JPEG decoder convert and downscale, if possible.
+            # draft is ignored for other formats
+            mode = 'L' if gray else _PILFrame.mode
+            size = (-(-_PILFrame.size[0] // reduce), -(-_PILFrame.size[1] // reduce))
+            _PILFrame.draft(mode, size)
+            
+            if gray and _PILFrame.mode != 'L':
+                _PILFrame = _PILFrame.convert('L')
+            if _PILFrame.size != size:
+                _PILFrame = _PILFrame.reduce(reduce)
+            
         npFrame = np.array(_PILFrame)
         
         print("read image from", filename)
@@ -67,5 +89,44 @@ def write(filename, npFrame):
     _PILFrame.save(filename)
     
     print("wrote array to", filename)
-    
-    
\ No newline at end of file
+
+
+def prefetch(filenames, depth=4, workers=2, gray=False, reduce=1):
+    """
+    Read image files in background threads. Up to depth files are
+    decoded ahead of the consumer, while it processes the current frame.
+
+    Parameters
+    ----------
+    filenames : iterable of str
+        names of image files to be read.
+    depth : int. optional.
+        max number of frames decoded ahead. default is 4.
+    workers : int. optional.
+        number of decoding threads. default is 2.
+    gray : bool. optional.
+        if True, images are converted to grayscale on decoding.
+        default is False.
+    reduce : int. optional.
+        factor of downscaling on decoding, one of 1, 2, 4, 8.
+        default is 1.
+
+    Yields
+    ------
+    npFrame : numpy array
+        converted image frames in order of filenames.
+
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # bounded queue of frames being decoded. depth frames stay
+        # queued beyond the frame yielded to the consumer
+        pending = deque()
+        
+        for filename in filenames:
+            pending.append(pool.submit(read, filename, gray, reduce))
+            
+            if len(pending) > depth:
+                yield pending.popleft().result()
+                
+        while pending:
+            yield pending.popleft().result()
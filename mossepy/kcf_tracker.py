@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Dec  4 10:27:31 2021
+
+@author: niklas
+"""
+
+
+import numpy as np
+
+from mossepy.adaptive_correlation_tracker import AdpCorrelation
+
+
+# available kernels
+KERNELS = ('gaussian', 'polynomial', 'linear')
+
+
+class KCF(AdpCorrelation):
+    """
+    Kernelized Correlation Filter (KCF) tracker class after Henriques
+    et al. (2015). Inherits from adaptive correlation tracker class.
+
+    The filter is trained on all cyclic shifts of the template at once,
+    so no random perturbations are needed. Kernel correlations of all
+    shifts are calculated in the Fourier domain.
+
+    Re-detection searches a linear filter over whole frames. The
+    kernelized filter has no such form, such that enableRedetection
+    raises a TypeError.
+    """
+
+    def __init__(self,
+                 relInDir='/data',
+                 relOutDir='/results',
+                 valRange=256,
+                 tempSize=[128, 128],
+                 sigma=[2., 2.],
+                 eps=0.1,
+                 lam=1e-4,
+                 rate=0.075,
+                 kernel='gaussian',
+                 kernelSigma=0.5,
+                 degree=2,
+                 offset=1.,
+                 fftBackend='numpy',
+                 workers=None,
+                 dtype='float64'):
+        """
+        constructor of KCF tracker class
+
+        Parameters
+        ----------
+        relInDir : string. optional.
+            relative input directory. default is '/data'.
+        relOutDir : string. optional.
+            relative output directory. default is '/results'.
+        valRange : int. optional.
+            image value range. default is 256.
+        tempSize : list of ints. optional.
+            vertical and horizontal size of template to be cropped.
+            default is [128, 128]
+        sigma : list of floats. optional.
+            standard deviations of optimal filter response.
+            default is [2., 2.].
+        eps : float. optional.
+            regularization parameter of pre-processing. default is 0.1.
+        lam : float. optional.
+            regularization parameter of ridge regression. default is 1e-4.
+        rate : float. optional.
+            learning rate used in running average of model.
+            default is 0.075.
+        kernel : string. optional.
+            'gaussian', 'polynomial' or 'linear'. default is 'gaussian'.
+        kernelSigma : float. optional.
+            standard deviation of Gaussian kernel. default is 0.5.
+        degree : int. optional.
+            degree of polynomial kernel. default is 2.
+        offset : float. optional.
+            offset of polynomial kernel. default is 1.
+        fftBackend : string or backend object. optional.
+            FFT backend, 'numpy', 'scipy' or 'pyfftw'. default is 'numpy'.
+        workers : int. optional.
+            number of FFT threads, if supported by backend. default is None.
+        dtype : string or numpy dtype. optional.
+            float type used in computations, 'float64' or 'float32'.
+            default is 'float64'.
+
+        Returns
+        -------
+        None.
+
+        """
+        if kernel not in KERNELS:
+            raise ValueError('unknown kernel: ' + kernel)
+
+        # dense training needs a single training step
+        AdpCorrelation.__init__(self,
+                                relInDir,
+                                relOutDir,
+                                valRange,
+                                tempSize,
+                                sigma,
+                                eps,
+                                1,
+                                rate,
+                                fftBackend,
+                                workers,
+                                None,
+                                dtype)
+
+        self.lam = lam
+        self.kernel = kernel
+        self.kernelSigma = kernelSigma
+        self.degree = degree
+        self.offset = offset
+
+        # model template, its spectrum and dual coefficients spectrum
+        self.xModel = None
+        self.XModel = None
+        self.alphaf = None
+
+    def kernelCorrelation(self, x, X, z, Z):
+        """
+        Calculate spectrum of kernel correlation of a template
+        with all cyclic shifts of another template.
+
+        Parameters
+        ----------
+        x : numpy array
+            pre-processed template, e.g. model template.
+        X : numpy array
+            half spectrum of x.
+        z : numpy array
+            pre-processed template.
+        Z : numpy array
+            half spectrum of z.
+
+        Returns
+        -------
+        K : numpy array
+            half spectrum of kernel correlation.
+
+        """
+        n = z.size
+
+        # cross-correlation of all shifts in one transform
+        xz = self.fft.irfft2(np.conj(X) * Z, self.tempSize)
+
+        if self.kernel == 'gaussian':
+            xx = np.vdot(x, x).real
+            zz = np.vdot(z, z).real
+            d = np.maximum(xx + zz - 2. * xz, 0.) / n
+            k = np.exp(-d / self.kernelSigma**2)
+        elif self.kernel == 'polynomial':
+            k = (xz / n + self.offset) ** self.degree
+        else:
+            k = xz / n
+
+        return self.fft.rfft2(k.astype(self.dtype, copy=False))
+
+    def calFilterResponse(self):
+        """
+        Calculate kernelized response of pre-processed template.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.prof.stage('preprocess'):
+            z = self.pre.process(self.f)
+        with self.prof.stage('fft'):
+            Z = self.fft.rfft2(z)
+
+        with self.prof.stage('respond'):
+            G = self.alphaf * self.kernelCorrelation(self.xModel, self.XModel, z, Z)
+
+        with self.prof.stage('ifft'):
+            self.g = self.fft.irfft2(G, self.tempSize)
+
+    def calSpatialFilter(self):
+        """
+        Calculate dual coefficients in spatial domain. Only needed
+        for output, as the kernelized filter has no spatial form.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.h = self.fft.irfft2(self.alphaf, self.tempSize)
+
+    def enableRedetection(self, psrLost=5., tileSize=None, maxTiles=16):
+        """
+        Re-detection is only available for linear filters.
+        Refused by a TypeError.
+
+        Returns
+        -------
+        None.
+
+        """
+        raise TypeError('re-detection is only available for '
+                        'linear filters')
+
+    def train(self):
+        """
+        Train dual coefficients on all cyclic shifts of current template.
+
+        Returns
+        -------
+        x : numpy array
+            pre-processed template.
+        X : numpy array
+            half spectrum of template.
+        alphaf : numpy array
+            half spectrum of dual coefficients.
+
+        """
+        with self.prof.stage('preprocess'):
+            # copy, as buffer of pre-processor is reused
+            x = self.pre.process(self.f).copy()
+        with self.prof.stage('fft'):
+            X = self.fft.rfft2(x)
+
+        with self.prof.stage('update'):
+            # kernel correlation of template with itself
+            K = self.kernelCorrelation(x, X, x, X)
+            alphaf = self.state.G / (K + self.lam)
+
+        return x, X, alphaf
+
+    def initFilter(self):
+        """
+        initialize filter by dense training on initial template
+
+        Returns
+        -------
+        None.
+
+        """
+        self.cropTemplate()
+        self.calOptimalResponse()
+
+        self.xModel, self.XModel, self.alphaf = self.train()
+
+    def updateFilter(self):
+        """
+        update filter using a running average on the previous model
+
+        Returns
+        -------
+        None.
+
+        """
+        self.cropTemplate()
+
+        x, X, alphaf = self.train()
+
+        with self.prof.stage('update'):
+            self.xModel = (1. - self.rate) * self.xModel + self.rate * x
+            self.XModel = (1. - self.rate) * self.XModel + self.rate * X
+            self.alphaf = (1. - self.rate) * self.alphaf + self.rate * alphaf
+
+    def stateHeader(self):
+        """
+        Get parameters and position saved in header of tracker state,
+        including regularization and kernel parameters.
+
+        Returns
+        -------
+        header : dict
+            JSON serializable parameters and position.
+
+        """
+        header = AdpCorrelation.stateHeader(self)
+        header.update({'lam': self.lam,
+                       'kernel': self.kernel,
+                       'kernelSigma': self.kernelSigma,
+                       'degree': self.degree,
+                       'offset': self.offset})
+
+        return header
+
+    def setStateHeader(self, header):
+        """
+        Set regularization and kernel parameters from header of
+        loaded tracker state. The model is only valid for the kernel
+        it was trained with.
+
+        Parameters
+        ----------
+        header : dict
+            header returned by stateHeader.
+
+        Returns
+        -------
+        None.
+
+        """
+        if 'kernel' not in header:
+            raise ValueError('state has no kernel parameters')
+        if header['kernel'] not in KERNELS:
+            raise ValueError('unknown kernel: ' + header['kernel'])
+
+        self.lam = header['lam']
+        self.kernel = header['kernel']
+        self.kernelSigma = header['kernelSigma']
+        self.degree = header['degree']
+        self.offset = header['offset']
+
+    def stateArrays(self):
+        """
+        Get arrays of filter saved in tracker state.
+
+        Returns
+        -------
+        arrays : dict of numpy arrays
+            model template and dual coefficients spectrum.
+
+        """
+        return {'xModel': self.xModel, 'alphaf': self.alphaf}
+
+    def setStateArrays(self, arrays):
+        """
+        Set filter from arrays of loaded tracker state.
+
+        Parameters
+        ----------
+        arrays : dict of numpy arrays
+            arrays returned by stateArrays.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.xModel = np.asarray(arrays['xModel'], dtype=self.dtype)
+        self.XModel = self.fft.rfft2(self.xModel)
+        self.alphaf = np.asarray(arrays['alphaf'])
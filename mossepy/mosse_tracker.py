@@ -27,7 +27,11 @@ class MOSSE(AdpCorrelation):
                  sigma=[2., 2.], 
                  eps=0.1,
                  trainSteps=256,
-                 rate=0.125):
+                 rate=0.125,
+                 fftBackend='numpy',
+                 workers=None,
+                 seed=None,
+                 dtype='float64'):
         """
         constructor of MOSSE tracker class
 
@@ -52,6 +56,17 @@ class MOSSE(AdpCorrelation):
         rate : float. optional.
             filter learning rate used in running average.
             default is 0.125.
+        fftBackend : string or backend object. optional.
+            FFT backend, 'numpy', 'scipy' or 'pyfftw'. default is 'numpy'.
+        workers : int. optional.
+            number of FFT threads, if supported by backend. default is None.
+        seed : int. optional.
+            seed of random training perturbations. default is None.
+        dtype : string or numpy dtype. optional.
+            float type used in computations, 'float64' or 'float32'.
+            spectra are of corresponding complex type. float32
+            halves memory traffic at a relative error of about 1e-6.
+            default is 'float64'.
             
         Returns
         -------
@@ -67,7 +82,11 @@ class MOSSE(AdpCorrelation):
                                 sigma, 
                                 eps,
                                 trainSteps,
-                                rate)
+                                rate,
+                                fftBackend,
+                                workers,
+                                seed,
+                                dtype)
         
     def initFilter(self):
         """
@@ -84,26 +103,22 @@ class MOSSE(AdpCorrelation):
         # and optimal response to it        
         self.calOptimalResponse()
         
+        # half spectrum of optimal response is cached
+        G = self.state.G
+        
         # template is varied with affine transformations here
-        # to get a training set. Train filter.
-        for i in range(0, self.trainSteps):
-            fi = utils.randWarp(self.f, self.tempSize)
-            fi = utils.preProcess(fi, self.tempSize, self.eps)
-            Fi = np.fft.fft2(fi)
-            conjFi = np.conj(Fi)
-            G = np.fft.fft2(self.g)
-            
-            if (i == 0):
-                self.A = G * conjFi
-                self.B = Fi * conjFi
-                
-            else:
-                self.A += G * conjFi
-                self.B += Fi * conjFi + self.eps
-                
-        conjH = self.A / self.B
-        H = np.conj(conjH)
-        self.h = np.fft.ifft2(H)
+        # to get a training set. All samples are processed as one stack.
+        fi = utils.randWarpBatch(self.f, self.tempSize, self.trainSteps, self.rng)
+        fi = self.pre.process(fi)
+        Fi = self.fft.rfft2(fi)
+        conjFi = np.conj(Fi)
+        
+        # train filter by summing over samples.
+        # denominator is real and regularized in all but first step
+        A = G * np.sum(conjFi, axis=0)
+        B = np.sum(np.real(Fi * conjFi), axis=0) + (self.trainSteps - 1) * self.eps
+        
+        self.state.setSpectra(A, B)
         
     def updateFilter(self):
         """
@@ -116,18 +131,19 @@ class MOSSE(AdpCorrelation):
         """
         # get template centered in new object position
         self.cropTemplate()
-        # set it as new ground truth        
-        self.calOptimalResponse()
         
-        fi = utils.preProcess(self.f, self.tempSize, self.eps)
-        Fi = np.fft.fft2(fi)
-        conjFi = np.conj(Fi)
-        G = np.fft.fft2(self.g)
+        # optimal response to it is cached
+        G = self.state.G
         
-        # use running average
-        self.A = (1. - self.rate) * self.A + self.rate * (G * conjFi)
-        self.B = (1. - self.rate) * self.B + + self.rate * (Fi * conjFi + self.eps)
+        with self.prof.stage('preprocess'):
+            fi = self.pre.process(self.f)
+        with self.prof.stage('fft'):
+            Fi = self.fft.rfft2(fi)
         
-        conjH =  self.A / self.B
-        H = np.conj(conjH)
-        self.h = np.fft.ifft2(H)
\ No newline at end of file
+        # use running average
+        with self.prof.stage('update'):
+            conjFi = np.conj(Fi)
+            A = (1. - self.rate) * self.state.A + self.rate * (G * conjFi)
+            B = (1. - self.rate) * self.state.B + self.rate * (np.real(Fi * conjFi) + self.eps)
+            
+            self.state.setSpectra(A, B)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Nov 27 11:12:45 2021
+
+@author: niklas
+"""
+
+
+import numpy as np
+
+from mossepy.adaptive_correlation_tracker import AdpCorrelation
+from mossepy.features import FeatureExtractor
+from mossepy.warp import getWarper
+
+
+class MultiChannelMOSSE(AdpCorrelation):
+    """
+    Multi-channel MOSSE tracker class. Inherits from adaptive
+    correlation tracker class.
+
+    Templates are stacks of feature channels, e.g. gray values and
+    gradient orientations. All channels are transformed in one batched
+    FFT. The filter of each channel has its own numerator, but all
+    channels share one denominator summed over channels, such that the
+    filter is still given in closed form.
+
+    Binning is not supported, as feature channels are taken at full
+    resolution, and setBinning raises a ValueError for factors other
+    than 1. Re-detection searches a single channel filter, such that
+    enableRedetection raises a TypeError.
+    """
+
+    def __init__(self,
+                 relInDir='/data',
+                 relOutDir='/results',
+                 valRange=256,
+                 tempSize=[128, 128],
+                 sigma=[2., 2.],
+                 eps=0.1,
+                 trainSteps=256,
+                 rate=0.125,
+                 fftBackend='numpy',
+                 workers=None,
+                 seed=None,
+                 dtype='float64',
+                 features=('gray', 'gradient')):
+        """
+        constructor of multi-channel MOSSE tracker class
+
+        Parameters
+        ----------
+        relInDir : string. optional.
+            relative input directory. default is '/data'.
+        relOutDir : string. optional.
+            relative output directory. default is '/results'.
+        valRange : int. optional.
+            image value range. default is 256.
+        tempSize : list of ints. optional.
+            vertical and horizontal size of template to be cropped.
+            default is [128, 128]
+        sigma : list of floats. optional.
+            standard deviations of optimal filter response.
+            default is [2., 2.].
+        eps : float. optional.
+            regularization parameter. default is 0.1.
+        trainSteps : int. optional.
+            number of initial training steps. default is 256.
+        rate : float. optional.
+            filter learning rate used in running average.
+            default is 0.125.
+        fftBackend : string or backend object. optional.
+            FFT backend, 'numpy', 'scipy' or 'pyfftw'. default is 'numpy'.
+        workers : int. optional.
+            number of FFT threads, if supported by backend. default is None.
+        seed : int. optional.
+            seed of random training perturbations. default is None.
+        dtype : string or numpy dtype. optional.
+            float type used in computations, 'float64' or 'float32'.
+            default is 'float64'.
+        features : tuple of strings or FeatureExtractor. optional.
+            feature kinds or extractor. Trackers of several objects in
+            the same frames share channels by sharing the extractor.
+            default is ('gray', 'gradient').
+
+        Returns
+        -------
+        None.
+
+        """
+        AdpCorrelation.__init__(self,
+                                relInDir,
+                                relOutDir,
+                                valRange,
+                                tempSize,
+                                sigma,
+                                eps,
+                                trainSteps,
+                                rate,
+                                fftBackend,
+                                workers,
+                                seed,
+                                dtype)
+
+        if not isinstance(features, FeatureExtractor):
+            features = FeatureExtractor(features, dtype=self.dtype)
+        self.features = features
+
+    def setBinning(self, binning=2):
+        """
+        Binning is not available for feature channels. Only binning 1,
+        i.e. no binning, is accepted.
+
+        Parameters
+        ----------
+        binning : int. optional.
+            edge length of cells. default is 2.
+
+        Returns
+        -------
+        None.
+
+        """
+        if binning != 1:
+            raise ValueError('binning is not available for feature channels')
+
+        AdpCorrelation.setBinning(self, binning)
+
+    def cropTemplate(self):
+        """
+        Crop feature template of all channels and grayscale template
+        for output.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.prof.stage('crop'):
+            self.f = self.cropper.crop(self.I, self.objPos)
+            self.x = self.features.crop(self.I, self.objPos, self.tempSize,
+                                        key=(self.imgFile, self.i),
+                                        mode=self.cropper.mode,
+                                        cval=self.cropper.cval)
+
+    def calFilterResponse(self):
+        """
+        Calculate response of feature template to filter, summed
+        over channels.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.prof.stage('preprocess'):
+            x = self.pre.process(self.x)
+        with self.prof.stage('fft'):
+            X = self.fft.rfft2(x)
+
+        with self.prof.stage('respond'):
+            G = self.state.respond(X).sum(axis=0)
+
+        with self.prof.stage('ifft'):
+            self.g = self.fft.irfft2(G, self.tempSize)
+
+    def calSpatialFilter(self):
+        """
+        Calculate filter in spatial domain, summed over channels.
+        Only needed for output.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.h = self.state.spatial().sum(axis=0)
+
+    def enableRedetection(self, psrLost=5., tileSize=None, maxTiles=16):
+        """
+        Re-detection is only available for single channel trackers.
+        Refused by a TypeError.
+
+        Returns
+        -------
+        None.
+
+        """
+        raise TypeError('re-detection is only available for '
+                        'single channel trackers')
+
+    def initFilter(self):
+        """
+        initialize filter by training on multiple perturbations of
+        initial feature template. All channels are warped alike.
+
+        Returns
+        -------
+        None.
+
+        """
+        # frames of a new run may reuse keys of cached frame
+        self.features.reset()
+
+        self.cropTemplate()
+        self.calOptimalResponse()
+
+        G = self.state.G
+
+        warper = getWarper(self.tempSize)
+        params = warper.sample(self.trainSteps, self.rng)
+        xi = np.stack([warper.apply(channel, *params) for channel in self.x], axis=1)
+
+        # transform all channels of all samples in one batch
+        xi = self.pre.process(xi)
+        Xi = self.fft.rfft2(xi)
+        conjXi = np.conj(Xi)
+
+        # numerator per channel, denominator shared by channels
+        A = G * np.sum(conjXi, axis=0)
+        B = np.sum(np.real(Xi * conjXi), axis=(0, 1)) + (self.trainSteps - 1) * self.eps
+
+        self.state.setSpectra(A, B)
+
+    def updateFilter(self):
+        """
+        update filter using a running average on the previous filter
+
+        Returns
+        -------
+        None.
+
+        """
+        self.cropTemplate()
+
+        G = self.state.G
+
+        with self.prof.stage('preprocess'):
+            x = self.pre.process(self.x)
+        with self.prof.stage('fft'):
+            X = self.fft.rfft2(x)
+
+        with self.prof.stage('update'):
+            conjX = np.conj(X)
+            A = (1. - self.rate) * self.state.A + self.rate * (G * conjX)
+            B = (1. - self.rate) * self.state.B \
+                + self.rate * (np.sum(np.real(X * conjX), axis=0) + self.eps)
+
+            self.state.setSpectra(A, B)
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Sep 25 10:31:08 2021
+
+@author: niklas
+"""
+
+
+import numpy as np
+
+import mossepy.response as resp
+import mossepy.utils as utils
+from mossepy.fft_backend import fastSize, getBackend
+from mossepy.filter_state import FilterState
+from mossepy.frame_source import toSource
+from mossepy.preprocess import Preprocessor
+
+
+class MultiMOSSE(object):
+    """
+    MOSSE tracker for multiple objects in common image sequence.
+
+    Filters of all objects are held in stacked arrays. Templates of all
+    objects are cropped from one frame and correlated, transformed and
+    updated in single batched operations. Optionally, templates of
+    large objects are binned, see setBinning.
+    """
+
+    def __init__(self,
+                 valRange=256,
+                 tempSize=[128, 128],
+                 sigma=[2., 2.],
+                 eps=0.1,
+                 trainSteps=256,
+                 rate=0.125,
+                 fftBackend='numpy',
+                 workers=None,
+                 seed=None,
+                 dtype='float64'):
+        """
+        constructor of multi object MOSSE tracker class
+
+        Parameters
+        ----------
+        valRange : int. optional.
+            image value range. default is 256.
+        tempSize : list of ints. optional.
+            vertical and horizontal size of template to be cropped.
+            Enlarged to the next fast FFT sizes, if necessary.
+            default is [128, 128]
+        sigma : list of floats. optional.
+            standard deviations of optimal filter response.
+            default is [2., 2.].
+        eps : float. optional.
+            regularization parameter. default is 0.1.
+        trainSteps : int. optional.
+            number of initial training steps. default is 256.
+        rate : float. optional.
+            filter learning rate used in running average.
+            default is 0.125.
+        fftBackend : string or backend object. optional.
+            FFT backend, 'numpy', 'scipy' or 'pyfftw'. default is 'numpy'.
+        workers : int. optional.
+            number of FFT threads, if supported by backend. default is None.
+        seed : int. optional.
+            seed of random training perturbations. default is None.
+        dtype : string or numpy dtype. optional.
+            float type used in computations, 'float64' or 'float32'.
+            spectra are of corresponding complex type. float32
+            halves memory traffic at a relative error of about 1e-6.
+            default is 'float64'.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.valRange = valRange
+        # size of templates, enlarged to fast FFT sizes
+        self.tempSize = fastSize(tempSize)
+        self.sigma = sigma
+        self.eps = eps
+        self.trainSteps = trainSteps
+        self.rate = rate
+
+        self.dtype = np.dtype(dtype)
+        self.fft = getBackend(fftBackend, workers)
+        self.rng = np.random.default_rng(seed)
+
+        # stacked filters of all objects
+        self.state = FilterState(valRange, self.tempSize, sigma, self.fft, self.dtype)
+        # pre-processing of template stacks into reused buffers
+        self.pre = Preprocessor(self.tempSize, eps, self.dtype)
+
+        # ids and positions of tracked objects
+        self.ids = []
+        self.objPos = np.zeros((0, 2), dtype=int)
+        self.subPos = np.zeros((0, 2))
+        self.nextId = 0
+
+        # confidence of tracking, i.e. Peak-to-Sidelobe Ratio per object
+        self.psr = np.zeros(0)
+        # min PSR of objects used for filter update
+        self.psrMin = None
+
+        # edge length of cells averaged into one template pixel
+        self.binning = 1
+        self.setOffsets()
+
+    def setOffsets(self):
+        """
+        Set offsets of pixels of cropped regions from object position.
+        Regions are of binning times the template size.
+
+        Returns
+        -------
+        None.
+
+        """
+        cropSize = [self.tempSize[0] * self.binning, self.tempSize[1] * self.binning]
+
+        self.dx = np.arange(cropSize[0]) - int(cropSize[0]/2)
+        self.dy = np.arange(cropSize[1]) - int(cropSize[1]/2)
+
+    def setBinning(self, binning=2):
+        """
+        Set binning of templates. Regions of the current crop size are
+        cropped and averaged over cells of binning x binning pixels, such
+        that templates, filters and FFTs shrink by binning in each axis.
+        Binned templates are enlarged to fast FFT sizes, if necessary.
+        Standard deviations of the optimal response are kept in image
+        pixels. Has to be set before objects are added.
+
+        Parameters
+        ----------
+        binning : int. optional.
+            edge length of cells. default is 2.
+
+        Returns
+        -------
+        None.
+
+        """
+        if self.ids:
+            raise ValueError('binning has to be set before objects are added')
+
+        # binned templates cover at least current crop size
+        cropSize = [len(self.dx), len(self.dy)]
+        self.tempSize = fastSize([-(-cropSize[0] // binning), -(-cropSize[1] // binning)])
+        self.binning = binning
+
+        sigma = [self.sigma[0] / binning, self.sigma[1] / binning]
+
+        self.state = FilterState(self.valRange, self.tempSize, sigma, self.fft, self.dtype)
+        self.pre = Preprocessor(self.tempSize, self.eps, self.dtype)
+        self.setOffsets()
+
+    def cropTemplates(self, objPos):
+        """
+        Crop templates around all given positions from current
+        grayscale image in a single gather. Pixels outside of
+        image are replaced by nearest border pixels. Binned
+        templates are averaged over cells of all regions at once.
+
+        Parameters
+        ----------
+        objPos : numpy array
+            object positions of shape (N, 2).
+
+        Returns
+        -------
+        None.
+
+        """
+        rows = np.clip(objPos[:, 0, None] + self.dx, 0, self.I.shape[0]-1)
+        cols = np.clip(objPos[:, 1, None] + self.dy, 0, self.I.shape[1]-1)
+
+        self.f = self.I[rows[:, :, None], cols[:, None, :]]
+
+        if self.binning > 1:
+            b = self.binning
+            self.f = self.f.reshape(len(objPos), self.tempSize[0], b,
+                                    self.tempSize[1], b).mean(axis=(2, 4))
+
+    def setImg(self, I):
+        """
+        Set current image. Image is converted to grayscale once
+        for all objects.
+
+        Parameters
+        ----------
+        I : numpy array
+            current image.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.I = utils.rgb2Gray(I, self.dtype)
+
+    def addTarget(self, I, objPos):
+        """
+        Add object to be tracked and train its filter on given image.
+
+        Parameters
+        ----------
+        I : numpy array
+            image containing object.
+        objPos : list of ints
+            object position in image.
+
+        Returns
+        -------
+        targetId : int
+            id of new object.
+
+        """
+        self.setImg(I)
+        pos = np.array([objPos], dtype=int)
+        self.cropTemplates(pos)
+
+        # train filter on random perturbations of template
+        fi = utils.randWarpBatch(self.f[0], self.tempSize, self.trainSteps, self.rng)
+        fi = self.pre.process(fi)
+        Fi = self.fft.rfft2(fi)
+        conjFi = np.conj(Fi)
+
+        A = self.state.G * np.sum(conjFi, axis=0, keepdims=True)
+        B = np.sum(np.real(Fi * conjFi), axis=0, keepdims=True) \
+            + (self.trainSteps - 1) * self.eps
+
+        # append filter to stacks
+        if self.ids:
+            A = np.concatenate((self.state.A, A))
+            B = np.concatenate((self.state.B, B))
+        self.state.setSpectra(A, B)
+
+        targetId = self.nextId
+        self.nextId += 1
+        self.ids.append(targetId)
+        self.objPos = np.concatenate((self.objPos, pos))
+        self.subPos = np.concatenate((self.subPos, pos))
+        self.psr = np.append(self.psr, np.inf)
+
+        return targetId
+
+    def removeTarget(self, targetId):
+        """
+        Stop tracking object.
+
+        Parameters
+        ----------
+        targetId : int
+            id of object.
+
+        Returns
+        -------
+        None.
+
+        """
+        k = self.ids.index(targetId)
+        del self.ids[k]
+
+        self.objPos = np.delete(self.objPos, k, axis=0)
+        self.subPos = np.delete(self.subPos, k, axis=0)
+        self.psr = np.delete(self.psr, k)
+        self.state.setSpectra(np.delete(self.state.A, k, axis=0),
+                              np.delete(self.state.B, k, axis=0))
+
+    def calObjPos(self):
+        """
+        Calculate positions of all objects from maxima in responses.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.cropTemplates(self.objPos)
+
+        # correlate all templates with their filters
+        F = self.fft.rfft2(self.f)
+        self.g = self.fft.irfft2(self.state.respond(F), self.tempSize)
+
+        # maximum positions in responses and confidences
+        gPos = resp.findPeaks(self.g)
+        self.psr = resp.calPSR(self.g, gPos)
+
+        dPos = gPos - [int(self.tempSize[0]/2), int(self.tempSize[1]/2)]
+
+        if self.binning == 1:
+            self.objPos = self.objPos + dPos
+            self.subPos = self.objPos + resp.refinePeaks(self.g, gPos)
+        else:
+            # integer peak of binned responses is too coarse
+            self.subPos = self.objPos + (dPos + resp.refinePeaks(self.g, gPos)) * self.binning
+            self.objPos = np.round(self.subPos).astype(int)
+
+    def setUpdateThreshold(self, psrMin=7.):
+        """
+        Set min Peak-to-Sidelobe Ratio (PSR) of objects used for filter
+        update. Filters of objects with lower PSR, e.g. due to occlusion,
+        are kept unchanged.
+
+        Parameters
+        ----------
+        psrMin : float. optional.
+            min PSR. None updates all filters. default is 7.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.psrMin = psrMin
+
+    def updateFilter(self):
+        """
+        Update all filters using a running average on previous filters.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.cropTemplates(self.objPos)
+
+        fi = self.pre.process(self.f)
+        Fi = self.fft.rfft2(fi)
+        conjFi = np.conj(Fi)
+
+        A = (1. - self.rate) * self.state.A + self.rate * (self.state.G * conjFi)
+        B = (1. - self.rate) * self.state.B + self.rate * (np.real(Fi * conjFi) + self.eps)
+
+        # keep filters of objects tracked without confidence
+        if self.psrMin is not None:
+            keep = (self.psr < self.psrMin)[:, None, None]
+            A = np.where(keep, self.state.A, A)
+            B = np.where(keep, self.state.B, B)
+
+        self.state.setSpectra(A, B)
+
+    def trackFrame(self, I):
+        """
+        Track all objects in new image.
+
+        Parameters
+        ----------
+        I : numpy array
+            current image.
+
+        Returns
+        -------
+        objPos : numpy array
+            object positions of shape (N, 2), ordered as ids.
+
+        """
+        self.setImg(I)
+
+        if self.ids:
+            self.calObjPos()
+            self.updateFilter()
+
+        return self.objPos
+
+    def track(self, frames):
+        """
+        Track all objects over given frames.
+
+        Parameters
+        ----------
+        frames : frame source, sequence or numpy array
+            frames to be tracked.
+
+        Yields
+        ------
+        imgFile : string
+            name of current frame.
+        objPos : numpy array
+            object positions of shape (N, 2), ordered as ids.
+
+        """
+        for imgFile, I in toSource(frames):
+            yield imgFile, self.trackFrame(I)
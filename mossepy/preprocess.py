@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pre-processing of templates according to MOSSE pre-processing steps:
+log transform, normalization and multiplication with a Hanning window.
+
+Created on Sun Nov 14 10:18:52 2021
+
+@author: niklas
+"""
+
+
+import numpy as np
+
+import mossepy.utils as utils
+
+
+# Hanning windows keyed by (size, dtype)
+_winCache = {}
+
+
+def getWindow(size, dtype=np.float64):
+    """
+    Get 2D Hanning window of given size. Windows are calculated
+    once and cached.
+
+    Parameters
+    ----------
+    size : list of ints
+        x and y size of window.
+    dtype : numpy dtype. optional.
+        float type of window. default is float64.
+
+    Returns
+    -------
+    win : numpy array
+        read-only 2D Hanning window.
+
+    """
+    dtype = np.dtype(dtype)
+    key = (tuple(size), dtype.str)
+
+    if key not in _winCache:
+        win = utils.hanning2D(size).astype(dtype)
+        win.setflags(write=False)
+        _winCache[key] = win
+
+    return _winCache[key]
+
+
+class Preprocessor(object):
+    """
+    Pre-process single templates of shape (H, W) or stacks of
+    templates of shape (N, H, W) in place into preallocated buffers.
+    The log transform of uint8 input is looked up in a table.
+    """
+
+    def __init__(self, size, eps=0.1, dtype=np.float64):
+        """
+        constructor of pre-processor class.
+
+        Parameters
+        ----------
+        size : list of ints
+            x and y size of templates.
+        eps : float. optional.
+            regularization parameter. default is 0.1.
+        dtype : numpy dtype. optional.
+            float type of output. default is float64.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.size = size
+        self.eps = eps
+        self.dtype = np.dtype(dtype)
+
+        self.win = getWindow(size, self.dtype)
+        # log transform of all uint8 values
+        self.logTable = np.log(np.arange(256) + 1.).astype(self.dtype)
+
+        # output buffers keyed by shape
+        self.bufs = {}
+
+    def process(self, Iin, out=None):
+        """
+        Pre-process template(s). If no output is given, the returned
+        buffer is overwritten by the next call with input of same shape.
+
+        Parameters
+        ----------
+        Iin : numpy array
+            template of shape (H, W) or stack of shape (N, H, W).
+        out : numpy array. optional.
+            output of same shape. default is None, i.e. internal
+            buffer is used.
+
+        Returns
+        -------
+        Iout : numpy array
+            pre-processed template(s).
+
+        """
+        if out is None:
+            if Iin.shape not in self.bufs:
+                self.bufs[Iin.shape] = np.empty(Iin.shape, dtype=self.dtype)
+            out = self.bufs[Iin.shape]
+
+        # log transform
+        if Iin.dtype == np.uint8:
+            np.take(self.logTable, Iin, out=out)
+        else:
+            np.add(Iin, 1., out=out)
+            np.log(out, out=out)
+
+        # normalize each template without temporary stacks
+        out -= out.mean(axis=(-2, -1), keepdims=True)
+        var = np.einsum('...ij,...ij->...', out, out) / (self.size[0] * self.size[1])
+        out /= (np.sqrt(var) + self.eps)[..., None, None]
+
+        # multiply with 2D Hanning window to reduce edge effects
+        out *= self.win
+
+        return out
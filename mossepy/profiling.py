@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Timing of tracking stages.
+
+Trackers time their stages through a profiler. By default, a null
+profiler is used, which does nothing.
+
+Created on Sun Oct  3 16:05:52 2021
+
+@author: niklas
+"""
+
+
+import csv
+import json
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+
+class _NullStage(object):
+    """
+    Context of untimed stage.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class NullProfiler(object):
+    """
+    Profiler doing nothing. Used when profiling is disabled.
+    """
+
+    enabled = False
+
+    _stage = _NullStage()
+
+    def stage(self, name):
+        return self._stage
+
+    def iterate(self, name, iterable):
+        return iter(iterable)
+
+    def frame(self):
+        pass
+
+
+# shared profiler of all trackers with disabled profiling
+NULL_PROFILER = NullProfiler()
+
+
+class _Stage(object):
+    """
+    Context timing one entry of a stage of profiler. A new context is
+    used per entry, such that nested stages and stages entered from
+    several threads do not share start times.
+    """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        if self.profiler.traceAlloc:
+            self.profiler.openAlloc(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        dt = time.perf_counter() - self.start
+
+        if self.profiler.traceAlloc:
+            alloc = self.profiler.closeAlloc(self)
+        else:
+            alloc = None
+
+        self.profiler.record(self.name, dt, alloc)
+        return False
+
+
+class Profiler(object):
+    """
+    Profiler recording wall clock times of tracking stages,
+    frame rate and optionally allocated memory per stage.
+    """
+
+    enabled = True
+
+    def __init__(self, traceAlloc=False):
+        """
+        constructor of profiler class.
+
+        Parameters
+        ----------
+        traceAlloc : bool. optional.
+            if True, peak memory allocated in each stage is recorded
+            using tracemalloc. This slows down tracking considerably.
+            default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.traceAlloc = traceAlloc
+        if traceAlloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        # stages with traced allocations, which are currently entered.
+        # the traced peak is global, so it is guarded by a lock
+        self.open = []
+        self.lock = threading.Lock()
+
+        # functions called with stage name and time of each record
+        self.hooks = []
+
+        self.reset()
+
+    def reset(self):
+        """
+        Clear all records.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.times = {}
+        self.allocs = {}
+
+        self.frames = 0
+        self.firstFrame = None
+        self.lastFrame = None
+
+    def addHook(self, hook):
+        """
+        Add hook, e.g. to forward records to monitoring.
+
+        Parameters
+        ----------
+        hook : function
+            called as hook(name, seconds) on each record.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.hooks.append(hook)
+
+    def stage(self, name):
+        """
+        Get context timing a stage.
+
+        Parameters
+        ----------
+        name : string
+            name of stage.
+
+        Returns
+        -------
+        stage : context manager
+            records time of enclosed code.
+
+        """
+        return _Stage(self, name)
+
+    def foldPeak(self):
+        """
+        Pass traced peak since last reset to all entered stages.
+        """
+        peak = tracemalloc.get_traced_memory()[1]
+
+        for stage in self.open:
+            stage.peak = max(stage.peak, peak)
+
+    def openAlloc(self, stage):
+        """
+        Start tracing allocations of entered stage. The traced peak is
+        reset, after it has been passed to enclosing stages.
+        """
+        with self.lock:
+            self.foldPeak()
+            tracemalloc.reset_peak()
+
+            stage.mem = tracemalloc.get_traced_memory()[0]
+            stage.peak = stage.mem
+            self.open.append(stage)
+
+    def closeAlloc(self, stage):
+        """
+        Stop tracing allocations of exited stage.
+
+        Returns
+        -------
+        alloc : int
+            peak memory allocated in stage in bytes.
+
+        """
+        with self.lock:
+            self.foldPeak()
+            self.open.remove(stage)
+
+        return stage.peak - stage.mem
+
+    def record(self, name, dt, alloc=None):
+        """
+        Record time of stage.
+
+        Parameters
+        ----------
+        name : string
+            name of stage.
+        dt : float
+            wall clock time in s.
+        alloc : int. optional.
+            peak memory allocated in bytes. default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.times.setdefault(name, []).append(dt)
+
+        if alloc is not None:
+            self.allocs.setdefault(name, []).append(alloc)
+
+        for hook in self.hooks:
+            hook(name, dt)
+
+    def iterate(self, name, iterable):
+        """
+        Iterate while recording time spent waiting for each item,
+        e.g. for reading frames.
+
+        Parameters
+        ----------
+        name : string
+            name of stage.
+        iterable : iterable
+            items to be iterated.
+
+        Yields
+        ------
+        item : object
+            items of iterable.
+
+        """
+        it = iter(iterable)
+
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            self.record(name, time.perf_counter() - start)
+
+            yield item
+
+    def frame(self):
+        """
+        Mark end of frame. Time between frames is recorded as stage 'frame'.
+
+        Returns
+        -------
+        None.
+
+        """
+        now = time.perf_counter()
+
+        if self.lastFrame is None:
+            self.firstFrame = now
+        else:
+            self.record('frame', now - self.lastFrame)
+
+        self.lastFrame = now
+        self.frames += 1
+
+    def summary(self):
+        """
+        Summarize records.
+
+        Returns
+        -------
+        summary : dict
+            per stage number of records, total, mean and percentiles
+            p50, p95, p99 of times in s, max allocated bytes if traced.
+            key 'fps' holds mean frame rate.
+
+        """
+        summary = {}
+
+        for name, times in self.times.items():
+            times = np.array(times)
+            p50, p95, p99 = np.percentile(times, [50, 95, 99])
+
+            summary[name] = {'count': len(times),
+                             'total': float(times.sum()),
+                             'mean': float(times.mean()),
+                             'p50': float(p50),
+                             'p95': float(p95),
+                             'p99': float(p99)}
+
+            if name in self.allocs:
+                summary[name]['allocMax'] = int(max(self.allocs[name]))
+
+        if self.frames > 1:
+            summary['fps'] = (self.frames - 1) / (self.lastFrame - self.firstFrame)
+
+        return summary
+
+    def toJSON(self, path):
+        """
+        Write summary to .json file.
+
+        Parameters
+        ----------
+        path : string
+            output path.
+
+        Returns
+        -------
+        None.
+
+        """
+        with open(path, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def toCSV(self, path):
+        """
+        Write summary to .csv file with one row per stage.
+
+        Parameters
+        ----------
+        path : string
+            output path.
+
+        Returns
+        -------
+        None.
+
+        """
+        summary = self.summary()
+        fps = summary.pop('fps', None)
+
+        keys = ['count', 'total', 'mean', 'p50', 'p95', 'p99', 'allocMax']
+
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['stage'] + keys + ['fps'])
+
+            for name, stats in summary.items():
+                writer.writerow([name] + [stats.get(key, '') for key in keys] + [''])
+
+            # frame rate in its own column
+            if fps is not None:
+                writer.writerow(['fps'] + [''] * len(keys) + [fps])
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Re-detection of lost objects by correlating the filter over the whole
+frame. The frame is split into overlapping tiles, which are correlated
+with the zero padded filter in one batched FFT (overlap-save). Only the
+parts of each tile response without circular wrap-around are kept.
+
+Created on Sun Nov  7 10:31:12 2021
+
+@author: niklas
+"""
+
+
+import numpy as np
+
+import mossepy.response as resp
+from mossepy.crop import GRAY_WEIGHTS
+
+
+def _boxMean(a, size):
+    """
+    Mean of all windows of given size over last two axes, computed from
+    summed area tables. Only windows inside of a are returned, i.e.
+    output at index i averages a[i:i + size].
+    """
+    H, W = size
+    S = np.zeros(a.shape[:-2] + (a.shape[-2] + 1, a.shape[-1] + 1))
+    np.cumsum(a, axis=-2, out=S[..., 1:, 1:])
+    np.cumsum(S[..., 1:, 1:], axis=-1, out=S[..., 1:, 1:])
+
+    return (S[..., H:, W:] - S[..., :-H, W:] - S[..., H:, :-W] + S[..., :-H, :-W]) / (H * W)
+
+
+class Redetector(object):
+    """
+    Tiled full frame search of a correlation filter.
+
+    To bound the time per frame, at most maxTiles tiles are correlated
+    per call. Tiles are visited in order of distance from the last known
+    object position, and the search continues over subsequent frames
+    until all tiles have been visited. Then it starts again.
+    """
+
+    def __init__(self, state, tempSize, tileSize=None, maxTiles=16, binning=1, eps=0.1):
+        """
+        constructor of re-detector class.
+
+        Parameters
+        ----------
+        state : FilterState
+            frequency domain state of filter to be searched for.
+        tempSize : list of ints
+            vertical and horizontal size of template.
+        tileSize : list of ints. optional.
+            vertical and horizontal FFT size of tiles, larger than
+            template. default is None, i.e. four times the template size.
+        maxTiles : int. optional.
+            max number of tiles correlated per frame. default is 16.
+        binning : int. optional.
+            binning of templates. The frame is binned alike.
+            default is 1.
+        eps : float. optional.
+            regularization parameter of normalization. default is 0.1.
+
+        Returns
+        -------
+        None.
+
+        """
+        if tileSize is None:
+            tileSize = [4 * tempSize[0], 4 * tempSize[1]]
+        if tileSize[0] <= tempSize[0] or tileSize[1] <= tempSize[1]:
+            raise ValueError('tiles have to be larger than template')
+
+        self.state = state
+        self.tempSize = tempSize
+        self.tileSize = tileSize
+        self.maxTiles = maxTiles
+        self.binning = binning
+        self.eps = eps
+
+        # valid response positions per tile
+        self.step = [tileSize[0] - tempSize[0] + 1,
+                     tileSize[1] - tempSize[1] + 1]
+
+        # conjugate spectra of padded filters, keyed by tile size,
+        # with filter version they were calculated from
+        self.spectra = {}
+
+        # upper left corners of tiles not yet visited
+        self.pending = []
+        # best match of current search
+        self.best = None
+
+    def filterSpectrum(self, fft):
+        """
+        Get conjugate spectrum of filter, zero padded to tile size.
+        Spectra are calculated once per tile size and filter version.
+
+        Parameters
+        ----------
+        fft : FFT backend
+            backend used for transforms.
+
+        Returns
+        -------
+        conjHpad : numpy array
+            conjugate half spectrum of padded filter.
+
+        """
+        key = tuple(self.tileSize)
+        version, conjHpad = self.spectra.get(key, (None, None))
+
+        if version != self.state.version:
+            # spatial filter is centered in origin, shift it back to
+            # template alignment before padding
+            h = np.roll(self.state.spatial(),
+                        (int(self.tempSize[0]/2), int(self.tempSize[1]/2)), axis=(0, 1))
+            hPad = np.zeros(key, dtype=h.dtype)
+            hPad[:self.tempSize[0], :self.tempSize[1]] = h
+            conjHpad = np.conj(fft.rfft2(hPad))
+            self.spectra[key] = (self.state.version, conjHpad)
+
+        return conjHpad
+
+    def reset(self):
+        """
+        Abort current search. Next call of search starts a new one.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.pending = []
+        self.best = None
+
+    def tileStack(self, I, tiles, dtype=np.float64):
+        """
+        Gather and pre-process tiles of frame. Only the regions of the
+        given tiles are processed, such that the time per call is bounded
+        by the number of tiles, not by the frame size. Tiles are log
+        transformed and normalized within template sized neighbourhoods,
+        like pre-processing of templates. Regions are enlarged by a
+        template on each side, such that normalization inside of tiles
+        equals normalization of the whole frame. Parts outside of the
+        frame replicate its border.
+
+        Parameters
+        ----------
+        I : numpy array
+            RGB or grayscale frame.
+        tiles : list of tuples
+            upper left corners of tiles in padded binned frame.
+        dtype : numpy dtype. optional.
+            float type of computations. default is float64.
+
+        Returns
+        -------
+        stack : numpy array
+            pre-processed tiles of shape (N, T0, T1).
+
+        """
+        H0, H1 = self.tempSize
+        T0, T1 = self.tileSize
+        b = self.binning
+        corners = np.array(tiles, dtype=int).reshape(-1, 2)
+
+        # rows and columns of enlarged regions in binned frame, where
+        # padding by half a template in front is undone
+        rows = corners[:, 0, None] - int(H0/2) - H0 + np.arange(T0 + 2 * H0)
+        cols = corners[:, 1, None] - int(H1/2) - H1 + np.arange(T1 + 2 * H1)
+        rows = np.clip(rows, 0, I.shape[0] // b - 1)
+        cols = np.clip(cols, 0, I.shape[1] // b - 1)
+
+        # rows and columns of cells in frame
+        if b > 1:
+            rows = (rows[:, :, None] * b + np.arange(b)).reshape(len(rows), -1)
+            cols = (cols[:, :, None] * b + np.arange(b)).reshape(len(cols), -1)
+
+        region = I[rows[:, :, None], cols[:, None, :]]
+        if region.ndim == 4:
+            region = np.dot(region[..., :3], np.array(GRAY_WEIGHTS, dtype=dtype))
+        else:
+            region = region.astype(dtype)
+
+        # average over cells of binned templates
+        if b > 1:
+            N, R, C = region.shape
+            region = region.reshape(N, R // b, b, C // b, b).mean(axis=(2, 4))
+
+        np.log(region + 1., out=region)
+
+        # deviations from mean of windows centered in region,
+        # enlarged by half a template
+        r0, c0 = int(H0/2), int(H1/2)
+        dev = region[:, r0:r0 + T0 + H0 + 1, c0:c0 + T1 + H1 + 1] - _boxMean(region, (H0, H1))
+
+        # standard deviations of windows centered in tiles
+        var = _boxMean(dev * dev, (H0, H1))
+        std = np.sqrt(np.maximum(var, 0.))
+        q0, q1 = H0 - 2 * r0, H1 - 2 * c0
+        std = std[:, q0:q0 + T0, q1:q1 + T1]
+
+        tiles = dev[:, H0 - r0:H0 - r0 + T0, H1 - c0:H1 - c0 + T1]
+
+        return (tiles / (std + self.eps)).astype(dtype, copy=False)
+
+    def search(self, I, objPos, fft, dtype=np.float64):
+        """
+        Correlate filter over next tiles of frame.
+
+        Parameters
+        ----------
+        I : numpy array
+            RGB or grayscale frame.
+        objPos : list of ints
+            last known object position, where search starts.
+        fft : FFT backend
+            backend used for transforms.
+        dtype : numpy dtype. optional.
+            float type of computations. default is float64.
+
+        Returns
+        -------
+        pos : list of ints
+            position of max response over all tiles searched
+            since start of current search.
+        peak : float
+            max response.
+
+        """
+        T0, T1 = self.tileSize
+        S0, S1 = self.step
+        b = self.binning
+
+        # size of binned frame
+        nRows0, nCols0 = I.shape[0] // b, I.shape[1] // b
+        objPos = [objPos[0] // b, objPos[1] // b]
+
+        # response of tile at position p in padded frame, i.e. template
+        # with upper left corner p, is located at object position p in frame
+        nRows = int(np.ceil(nRows0 / S0))
+        nCols = int(np.ceil(nCols0 / S1))
+
+        if not self.pending:
+            # new search, nearest tiles first
+            r0, c0 = np.meshgrid(np.arange(nRows) * S0, np.arange(nCols) * S1,
+                                 indexing='ij')
+            r0 = r0.ravel()
+            c0 = c0.ravel()
+            dist = ((r0 + S0/2 - objPos[0])**2
+                    + (c0 + S1/2 - objPos[1])**2)
+            order = np.argsort(dist, kind='stable')
+            self.pending = list(zip(r0[order], c0[order]))
+            self.best = None
+
+        tiles = self.pending[:self.maxTiles]
+        self.pending = self.pending[self.maxTiles:]
+
+        stack = self.tileStack(I, tiles, dtype)
+
+        # correlate tiles in one batch, keep valid part
+        g = fft.irfft2(fft.rfft2(stack) * self.filterSpectrum(fft), self.tileSize)
+        g = g[:, :S0, :S1]
+
+        peaks = resp.findPeaks(g)
+        values = resp.peakValues(g, peaks)
+        k = int(np.argmax(values))
+
+        pos = [int(tiles[k][0] + peaks[k, 0]) * b,
+               int(tiles[k][1] + peaks[k, 1]) * b]
+        pos = [min(max(pos[0], 0), I.shape[0] - 1),
+               min(max(pos[1], 0), I.shape[1] - 1)]
+
+        if self.best is None or values[k] > self.best[1]:
+            self.best = (pos, float(values[k]))
+
+        return self.best
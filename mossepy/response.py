@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Analysis of correlation responses: peak positions with subpixel
+refinement and Peak-to-Sidelobe Ratio (PSR) after Bolme et al. (2010).
+
+All routines work on single responses of shape (H, W) and on stacks
+of responses of shape (..., H, W).
+
+Created on Sun Oct 31 11:44:02 2021
+
+@author: niklas
+"""
+
+
+import numpy as np
+
+
+def _flat(g, peaks):
+    """
+    Reshape responses to (N, H, W) and peaks to (N, 2).
+    """
+    H, W = g.shape[-2:]
+
+    return g.reshape(-1, H, W), np.reshape(peaks, (-1, 2))
+
+
+def findPeaks(g):
+    """
+    Find integer positions of response maxima.
+
+    Parameters
+    ----------
+    g : numpy array
+        real response(s) of shape (..., H, W).
+
+    Returns
+    -------
+    peaks : numpy array
+        row and column of maxima, of shape (..., 2).
+
+    """
+    flat = g.reshape(g.shape[:-2] + (-1,))
+    idx = np.argmax(flat, axis=-1)
+
+    return np.stack(np.unravel_index(idx, g.shape[-2:]), axis=-1)
+
+
+def peakValues(g, peaks):
+    """
+    Get response values at peaks.
+
+    Parameters
+    ----------
+    g : numpy array
+        real response(s) of shape (..., H, W).
+    peaks : numpy array
+        peak positions of shape (..., 2).
+
+    Returns
+    -------
+    values : numpy array
+        response values of shape (...).
+
+    """
+    g3, p = _flat(g, peaks)
+    values = g3[np.arange(len(p)), p[:, 0], p[:, 1]]
+
+    return values.reshape(g.shape[:-2])
+
+
+def refinePeaks(g, peaks):
+    """
+    Refine peak positions to subpixel accuracy by fitting parabolas
+    through each peak and its direct neighbours, separately per axis.
+    Neighbours wrap around, as responses are circular.
+
+    Parameters
+    ----------
+    g : numpy array
+        real response(s) of shape (..., H, W).
+    peaks : numpy array
+        integer peak positions of shape (..., 2).
+
+    Returns
+    -------
+    offsets : numpy array
+        subpixel offsets from peaks in [-0.5, 0.5], of shape (..., 2).
+
+    """
+    g3, p = _flat(g, peaks)
+    H, W = g3.shape[1:]
+    n = np.arange(len(p))
+    r = p[:, 0]
+    c = p[:, 1]
+
+    center = g3[n, r, c]
+    offsets = np.zeros(p.shape)
+
+    for axis, (prev, post) in enumerate(((g3[n, (r - 1) % H, c], g3[n, (r + 1) % H, c]),
+                                         (g3[n, r, (c - 1) % W], g3[n, r, (c + 1) % W]))):
+        curv = prev - 2. * center + post
+        # only maxima with negative curvature can be refined
+        valid = curv < 0
+        offsets[valid, axis] = 0.5 * (prev - post)[valid] / curv[valid]
+
+    offsets = np.clip(offsets, -0.5, 0.5)
+
+    return offsets.reshape(np.shape(peaks))
+
+
+def calPSR(g, peaks, exclude=11):
+    """
+    Calculate Peak-to-Sidelobe Ratio of responses. The sidelobe is
+    the response without a window of size exclude around the peak.
+    The window is clamped per axis, such that at least two rows and
+    columns of small responses remain in the sidelobe.
+
+    Parameters
+    ----------
+    g : numpy array
+        real response(s) of shape (..., H, W).
+    peaks : numpy array
+        peak positions of shape (..., 2).
+    exclude : int. optional.
+        edge length of window excluded around peak. default is 11.
+
+    Returns
+    -------
+    psr : numpy array
+        PSR of shape (...).
+
+    """
+    g3, p = _flat(g, peaks)
+    N, H, W = g3.shape
+    n = np.arange(N)
+
+    # window around peak clamped to response, wrapped around borders
+    exRows = max(min(exclude, H - 2), 1)
+    exCols = max(min(exclude, W - 2), 1)
+    count = H * W - exRows * exCols
+    if count <= 0:
+        raise ValueError('response too small for sidelobe')
+
+    rows = (p[:, 0, None] + np.arange(exRows) - int(exRows/2)) % H
+    cols = (p[:, 1, None] + np.arange(exCols) - int(exCols/2)) % W
+    win = g3[n[:, None, None], rows[:, :, None], cols[:, None, :]]
+
+    # sidelobe statistics from totals minus window
+    mean = (g3.sum(axis=(1, 2)) - win.sum(axis=(1, 2))) / count
+    sq = ((g3**2).sum(axis=(1, 2)) - (win**2).sum(axis=(1, 2))) / count
+    std = np.sqrt(np.maximum(sq - mean**2, 0.))
+
+    peak = g3[n, p[:, 0], p[:, 1]]
+    psr = (peak - mean) / np.maximum(std, np.finfo(float).tiny)
+
+    return psr.reshape(g.shape[:-2])
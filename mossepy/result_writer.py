@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Writers of tracking results with configurable output level.
+
+Created on Sat Oct  2 09:48:15 2021
+
+@author: niklas
+"""
+
+
+import os
+import queue
+import threading
+
+import numpy as np
+
+import mossepy.image as img
+
+
+# output levels
+POSITIONS = 0   # object positions only
+PEAKS = 1       # positions and response peak statistics
+IMAGES = 2      # positions, peak statistics and template, filter and response
+
+
+def peakStats(g):
+    """
+    Calculate statistics of response peak.
+
+    Parameters
+    ----------
+    g : numpy array
+        filter response.
+
+    Returns
+    -------
+    stats : list of floats
+        peak value, mean and standard deviation of response.
+
+    """
+    return [g.max(), g.mean(), g.std()]
+
+
+def toValRange(M, valRange):
+    """
+    Scale array to image value range for output.
+
+    Parameters
+    ----------
+    M : numpy array
+        array to be scaled.
+    valRange : int
+        image value range.
+
+    Returns
+    -------
+    M : numpy array
+        scaled array.
+
+    """
+    return (valRange-1)/M.max() * M
+
+
+class ResultWriter(object):
+    """
+    Basic result writer class.
+
+    Writing has to be done in inherited class.
+    """
+
+    def __init__(self, outDir, valRange, level):
+        """
+        Constructor of result writer class.
+
+        Parameters
+        ----------
+        outDir : string
+            output directory.
+        valRange : int
+            image value range.
+        level : int
+            output level, POSITIONS, PEAKS or IMAGES.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.outDir = outDir
+        self.valRange = valRange
+        self.level = level
+
+    def write(self, name, objPos, f, g, h):
+        """
+        Write results of single frame.
+
+        Parameters
+        ----------
+        name : string
+            name of frame.
+        objPos : list of ints
+            object position.
+        f : numpy array
+            template.
+        g : numpy array
+            filter response.
+        h : numpy array
+            spatial filter. Only needed for output level IMAGES.
+
+        Returns
+        -------
+        None.
+
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Finish writing. Writer can be reused afterwards.
+
+        Returns
+        -------
+        None.
+
+        """
+        pass
+
+
+class JpgWriter(ResultWriter):
+    """
+    Write positions and peak statistics to results.csv and images to
+    one .jpg file per frame and kind. Images are optionally written
+    by background threads fed by a bounded queue.
+    """
+
+    def __init__(self, outDir, valRange, level=IMAGES, workers=0, depth=16):
+        """
+        Constructor of .jpg writer class.
+
+        Parameters
+        ----------
+        outDir : string
+            output directory.
+        valRange : int
+            image value range.
+        level : int. optional.
+            output level, POSITIONS, PEAKS or IMAGES. default is IMAGES.
+        workers : int. optional.
+            number of writing threads. default is 0, i.e. images
+            are written synchronously.
+        depth : int. optional.
+            max number of frames waiting to be written. default is 16.
+
+        Returns
+        -------
+        None.
+
+        """
+        ResultWriter.__init__(self, outDir, valRange, level)
+
+        self.workers = workers
+        self.depth = depth
+
+        self.table = None
+        self.threads = []
+        # first error raised in writing threads
+        self.error = None
+
+    def start(self):
+        """
+        Open result table and start writing threads.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.table = open(self.outDir + '/results.csv', 'w')
+
+        header = 'frame,row,col'
+        if self.level >= PEAKS:
+            header += ',peak,mean,std'
+        self.table.write(header + '\n')
+
+        self.error = None
+        self.queue = queue.Queue(maxsize=self.depth)
+        self.threads = [threading.Thread(target=self.work, daemon=True)
+                        for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def work(self):
+        """
+        Write queued images until None is received. Errors are stored
+        and raised in the tracking thread, while the queue is still
+        drained, such that the tracker does not block on a full queue.
+
+        Returns
+        -------
+        None.
+
+        """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            if self.error is not None:
+                continue
+            try:
+                self.writeImages(*item)
+            except Exception as err:
+                self.error = err
+
+    def writeImages(self, name, f, g, h):
+        """
+        Write template, filter and response of single frame to files.
+
+        Parameters
+        ----------
+        name : string
+            name of frame.
+        f : numpy array
+            template.
+        g : numpy array
+            filter response.
+        h : numpy array
+            spatial filter.
+
+        Returns
+        -------
+        None.
+
+        """
+        # fit images to valRange for output
+        f = toValRange(f, self.valRange)
+        g = toValRange(g, self.valRange)
+        h = toValRange(h, self.valRange)
+
+        # define output paths
+        temPath = self.outDir + '/' + name + '_tem.jpg'
+        filPath = self.outDir + '/' + name + '_fil.jpg'
+        resPath = self.outDir + '/' + name + '_res.jpg'
+
+        # save results to files
+        img.write(temPath, f)
+        img.write(filPath, abs(np.fft.ifftshift(h)))
+        img.write(resPath, abs(g))
+
+    def write(self, name, objPos, f, g, h):
+        if self.table is None:
+            self.start()
+        if self.error is not None:
+            raise self.error
+
+        name = os.path.splitext(name)[0]
+
+        row = [name, str(objPos[0]), str(objPos[1])]
+        if self.level >= PEAKS:
+            row += ['%g' % x for x in peakStats(g)]
+        self.table.write(','.join(row) + '\n')
+
+        if self.level >= IMAGES:
+            if self.threads:
+                # template buffer is reused by tracker, so copy it.
+                # blocks, if queue is full
+                self.queue.put((name, f.copy(), g, h))
+            else:
+                self.writeImages(name, f, g, h)
+
+    def close(self):
+        if self.table is None:
+            return
+
+        for thread in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+        self.table.close()
+        self.table = None
+        self.threads = []
+
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+
+class NpzWriter(ResultWriter):
+    """
+    Collect results of frames and write them in chunks to numbered
+    compressed files results000000.npz, results000001.npz, ... Chunks
+    are written atomically, so memory is bounded by the chunk size and
+    a crash loses at most the results of the current chunk. Chunks of
+    a previous run in the output directory are removed.
+    """
+
+    def __init__(self, outDir, valRange, level=IMAGES, chunkSize=256):
+        """
+        Constructor of .npz writer class.
+
+        Parameters
+        ----------
+        outDir : string
+            output directory.
+        valRange : int
+            image value range.
+        level : int. optional.
+            output level, POSITIONS, PEAKS or IMAGES. default is IMAGES.
+        chunkSize : int. optional.
+            number of frames per chunk. default is 256.
+
+        Returns
+        -------
+        None.
+
+        """
+        ResultWriter.__init__(self, outDir, valRange, level)
+
+        self.chunkSize = chunkSize
+        # number of next chunk
+        self.k = 0
+
+        for path in chunkPaths(outDir):
+            os.remove(path)
+
+        self.reset()
+
+    def reset(self):
+        """
+        Clear collected results.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.results = {'frame': [], 'objPos': []}
+
+        if self.level >= PEAKS:
+            self.results['peak'] = []
+        if self.level >= IMAGES:
+            self.results['template'] = []
+            self.results['filter'] = []
+            self.results['response'] = []
+
+    def write(self, name, objPos, f, g, h):
+        self.results['frame'].append(os.path.splitext(name)[0])
+        self.results['objPos'].append(objPos)
+
+        if self.level >= PEAKS:
+            self.results['peak'].append(peakStats(g))
+        if self.level >= IMAGES:
+            self.results['template'].append(np.array(f, dtype=np.float32))
+            self.results['filter'].append(np.fft.ifftshift(h).astype(np.float32))
+            self.results['response'].append(np.asarray(g, dtype=np.float32))
+
+        if len(self.results['frame']) == self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        """
+        Write collected results to next chunk.
+
+        Returns
+        -------
+        None.
+
+        """
+        if not self.results['frame']:
+            return
+
+        path = self.outDir + '/results%06d.npz' % self.k
+        with open(path + '.tmp', 'wb') as file:
+            np.savez_compressed(file, **{key: np.array(val) for key, val in self.results.items()})
+        os.replace(path + '.tmp', path)
+
+        self.k += 1
+        self.reset()
+
+    def close(self):
+        self.flush()
+
+
+def chunkPaths(outDir):
+    """
+    Get paths of chunks written by .npz writer in order.
+
+    Parameters
+    ----------
+    outDir : string
+        output directory.
+
+    Returns
+    -------
+    paths : list of strings
+        paths of chunks.
+
+    """
+    if not os.path.isdir(outDir):
+        return []
+
+    names = sorted(name for name in os.listdir(outDir)
+                   if name.startswith('results') and name.endswith('.npz')
+                   and name[7:-4].isdigit())
+
+    return [outDir + '/' + name for name in names]
+
+
+def loadNpz(outDir):
+    """
+    Load results written by .npz writer, concatenated over chunks.
+
+    Parameters
+    ----------
+    outDir : string
+        output directory.
+
+    Returns
+    -------
+    results : dict of numpy arrays
+        results of all frames, keyed as in chunks.
+
+    """
+    chunks = []
+    for path in chunkPaths(outDir):
+        with np.load(path) as chunk:
+            chunks.append(dict(chunk))
+
+    if not chunks:
+        return {}
+
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
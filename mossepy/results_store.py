@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Append-only store of per-frame tracking results.
+
+A store is a directory with one subdirectory per sequence. Records of
+a sequence are buffered in memory and written in chunks to numbered
+.npy files. An index of chunks with their first and last frame is
+rewritten after each chunk, such that frame ranges are queried from
+memory mapped chunks without reading the whole sequence. Chunks and
+index are written atomically, so a crash loses at most the records
+of the current chunk.
+
+Created on Sat Nov 20 10:04:37 2021
+
+@author: niklas
+"""
+
+
+import os
+import time
+
+import numpy as np
+
+
+# fields of a result record
+RECORD = np.dtype([('frame', '<i8'),    # frame number
+                   ('row', '<i4'),      # object position
+                   ('col', '<i4'),
+                   ('dRow', '<f4'),     # subpixel offset of response peak
+                   ('dCol', '<f4'),
+                   ('peak', '<f4'),     # response peak value
+                   ('psr', '<f4'),      # Peak-to-Sidelobe Ratio
+                   ('time', '<f4')])    # processing time of frame in s
+
+# fields of an index entry
+INDEX = np.dtype([('chunk', '<i4'),
+                  ('first', '<i8'),
+                  ('last', '<i8'),
+                  ('n', '<i4')])
+
+
+def _saveAtomic(path, arr):
+    """
+    Save array to .npy file via temporary file.
+    """
+    with open(path + '.tmp', 'wb') as file:
+        np.save(file, arr)
+    os.replace(path + '.tmp', path)
+
+
+def _chunkPath(seqDir, k):
+    return os.path.join(seqDir, 'chunk%06d.npy' % k)
+
+
+class SequenceWriter(object):
+    """
+    Append records of a single sequence to a store. Can be added as
+    observer to a tracker, which appends a record per frame.
+    """
+
+    def __init__(self, seqDir, chunkSize=4096, mode='a'):
+        """
+        constructor of sequence writer class.
+
+        Parameters
+        ----------
+        seqDir : string
+            directory of sequence in store.
+        chunkSize : int. optional.
+            number of records per chunk. default is 4096.
+        mode : string. optional.
+            'a' appends to existing records, 'w' removes them first.
+            default is 'a'.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.seqDir = seqDir
+        self.chunkSize = chunkSize
+
+        os.makedirs(seqDir, exist_ok=True)
+        self.indexPath = os.path.join(seqDir, 'index.npy')
+
+        if mode == 'w':
+            for name in os.listdir(seqDir):
+                os.remove(os.path.join(seqDir, name))
+        elif mode != 'a':
+            raise ValueError('unknown mode: ' + mode)
+
+        if os.path.exists(self.indexPath):
+            self.index = np.load(self.indexPath)
+        else:
+            self.index = np.zeros(0, dtype=INDEX)
+
+        self.buf = np.zeros(chunkSize, dtype=RECORD)
+        self.n = 0
+
+        # time of last observed frame
+        self.last = None
+
+    def append(self, frame, objPos, subOffset=(0., 0.), peak=np.nan, psr=np.nan, dt=np.nan):
+        """
+        Append record of single frame. Full chunks are written.
+
+        Parameters
+        ----------
+        frame : int
+            frame number.
+        objPos : list of ints
+            object position.
+        subOffset : list of floats. optional.
+            subpixel offset of response peak. default is (0., 0.).
+        peak : float. optional.
+            response peak value. default is nan.
+        psr : float. optional.
+            Peak-to-Sidelobe Ratio. default is nan.
+        dt : float. optional.
+            processing time of frame in s. default is nan.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.buf[self.n] = (frame, objPos[0], objPos[1], subOffset[0], subOffset[1],
+                            peak, psr, dt)
+        self.n += 1
+
+        if self.n == self.chunkSize:
+            self.flush()
+
+    def __call__(self, tracker, dt=None):
+        """
+        Append record of current frame of tracker.
+
+        Parameters
+        ----------
+        tracker : Correlation
+            tracker notifying its observers.
+        dt : float. optional.
+            processing time of frame in s. default is None, i.e. time
+            since last call.
+
+        Returns
+        -------
+        None.
+
+        """
+        now = time.perf_counter()
+        if dt is None:
+            dt = np.nan if self.last is None else now - self.last
+        self.last = now
+
+        # position of first frame is given, not correlated, so
+        # response of a previous run must not be recorded
+        if tracker.i > 1:
+            subOffset = getattr(tracker, 'subOffset', (0., 0.))
+            peak = np.nan if tracker.peak is None else tracker.peak
+            psr = tracker.psr
+        else:
+            subOffset, peak, psr = (0., 0.), np.nan, np.inf
+
+        self.append(tracker.i, tracker.objPos, subOffset, peak, psr, dt)
+
+    def flush(self):
+        """
+        Write buffered records as new chunk and update index.
+
+        Returns
+        -------
+        None.
+
+        """
+        if self.n == 0:
+            return
+
+        records = self.buf[:self.n]
+        k = int(self.index['chunk'][-1]) + 1 if len(self.index) else 0
+
+        _saveAtomic(_chunkPath(self.seqDir, k), records)
+
+        entry = np.array([(k, records['frame'].min(), records['frame'].max(), self.n)],
+                         dtype=INDEX)
+        self.index = np.concatenate((self.index, entry))
+        _saveAtomic(self.indexPath, self.index)
+
+        self.n = 0
+
+    def close(self):
+        """
+        Write remaining records.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.flush()
+
+
+class ResultStore(object):
+    """
+    Store of tracking results of many sequences.
+    """
+
+    def __init__(self, root, chunkSize=4096):
+        """
+        constructor of result store class.
+
+        Parameters
+        ----------
+        root : string
+            directory of store.
+        chunkSize : int. optional.
+            number of records per chunk of new writers. default is 4096.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.root = root
+        self.chunkSize = chunkSize
+
+        os.makedirs(root, exist_ok=True)
+
+    def writer(self, seqId, mode='a'):
+        """
+        Get writer of sequence. Each sequence must only be written
+        by a single writer at a time.
+
+        Parameters
+        ----------
+        seqId : string
+            id of sequence.
+        mode : string. optional.
+            'a' appends to existing records, 'w' removes them first.
+            default is 'a'.
+
+        Returns
+        -------
+        writer : SequenceWriter
+            writer of sequence.
+
+        """
+        return SequenceWriter(os.path.join(self.root, str(seqId)), self.chunkSize, mode)
+
+    def sequences(self):
+        """
+        List ids of all sequences in store.
+
+        Returns
+        -------
+        seqIds : list of strings
+            sorted sequence ids.
+
+        """
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, name, 'index.npy')))
+
+    def query(self, seqId, start=None, stop=None):
+        """
+        Get records of sequence in frame range [start, stop).
+        Only chunks overlapping the range are read.
+
+        Parameters
+        ----------
+        seqId : string
+            id of sequence.
+        start : int. optional.
+            first frame. default is None, i.e. from first frame.
+        stop : int. optional.
+            frame after last frame. default is None, i.e. to last frame.
+
+        Returns
+        -------
+        records : numpy array
+            records of RECORD dtype in order of appending.
+
+        """
+        seqDir = os.path.join(self.root, str(seqId))
+        index = np.load(os.path.join(seqDir, 'index.npy'))
+
+        lo = -np.inf if start is None else start
+        hi = np.inf if stop is None else stop
+
+        parts = []
+        for entry in index[(index['last'] >= lo) & (index['first'] < hi)]:
+            chunk = np.load(_chunkPath(seqDir, entry['chunk']), mmap_mode='r')
+            mask = (chunk['frame'] >= lo) & (chunk['frame'] < hi)
+            parts.append(chunk[mask])
+
+        if not parts:
+            return np.zeros(0, dtype=RECORD)
+
+        return np.concatenate(parts)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 30 10:05:18 2021
+
+@author: niklas
+"""
+
+
+from collections import OrderedDict
+
+import numpy as np
+
+import mossepy.response as resp
+from mossepy.crop import Cropper
+from mossepy.mosse_tracker import MOSSE
+
+
+class ScaleMOSSE(MOSSE):
+    """
+    Scale adaptive MOSSE tracker class. Inherits from MOSSE
+    tracker class.
+
+    In each frame, templates are resampled from a small pyramid of
+    scales around the current object scale and correlated in a single
+    batched FFT. The scale of maximum Peak-to-Sidelobe Ratio gives
+    object position and new object scale.
+
+    Binning is not available, as templates are resampled at the object
+    scale anyway. setBinning raises a ValueError for binning > 1.
+    """
+
+    # max number of cached croppers of regions around object
+    maxBoxCroppers = 4
+
+    def __init__(self,
+                 relInDir='/data',
+                 relOutDir='/results',
+                 valRange=256,
+                 tempSize=[128, 128],
+                 sigma=[2., 2.],
+                 eps=0.1,
+                 trainSteps=256,
+                 rate=0.125,
+                 fftBackend='numpy',
+                 workers=None,
+                 seed=None,
+                 dtype='float64',
+                 nScales=5,
+                 scaleStep=1.05,
+                 scaleLimits=[0.2, 5.]):
+        """
+        constructor of scale adaptive MOSSE tracker class
+
+        Parameters
+        ----------
+        relInDir : string. optional.
+            relative input directory. default is '/data'.
+        relOutDir : string. optional.
+            relative output directory. default is '/results'.
+        valRange : int. optional.
+            image value range. default is 256.
+        tempSize : list of ints. optional.
+            vertical and horizontal size of template to be cropped.
+            default is [128, 128]
+        sigma : list of floats. optional.
+            standard deviations of optimal filter response.
+            default is [2., 2.].
+        eps : float. optional.
+            regularization parameter. default is 0.1.
+        trainSteps : int. optional.
+            number of initial training steps. default is 256.
+        rate : float. optional.
+            filter learning rate used in running average.
+            default is 0.125.
+        fftBackend : string or backend object. optional.
+            FFT backend, 'numpy', 'scipy' or 'pyfftw'. default is 'numpy'.
+        workers : int. optional.
+            number of FFT threads, if supported by backend. default is None.
+        seed : int. optional.
+            seed of random training perturbations. default is None.
+        dtype : string or numpy dtype. optional.
+            float type used in computations, 'float64' or 'float32'.
+            default is 'float64'.
+        nScales : int. optional.
+            number of scales evaluated per frame. default is 5.
+        scaleStep : float. optional.
+            ratio of neighbouring scales. default is 1.05.
+        scaleLimits : list of floats. optional.
+            min and max object scale relative to initial object.
+            default is [0.2, 5.].
+
+        Returns
+        -------
+        None.
+
+        """
+        MOSSE.__init__(self,
+                       relInDir,
+                       relOutDir,
+                       valRange,
+                       tempSize,
+                       sigma,
+                       eps,
+                       trainSteps,
+                       rate,
+                       fftBackend,
+                       workers,
+                       seed,
+                       dtype)
+
+        self.scaleLimits = scaleLimits
+
+        # object scale relative to initial object
+        self.scale = 1.
+        # size of object box in image
+        self.boxSize = list(self.tempSize)
+
+        # relative scales of pyramid, centered at 1
+        self.setFactors(scaleStep ** (np.arange(nScales) - int(nScales/2)))
+
+        # least recently used croppers of regions around object,
+        # keyed by region size, which changes with object scale
+        self.boxCroppers = OrderedDict()
+
+    def setFactors(self, factors):
+        """
+        Set relative scales of pyramid and calculate interpolation maps,
+        i.e. offsets of sample positions from object position per scale
+        at object scale 1.
+
+        Parameters
+        ----------
+        factors : numpy array
+            relative scales of pyramid.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.factors = np.asarray(factors, dtype=float)
+
+        dr = np.arange(self.tempSize[0]) - int(self.tempSize[0]/2)
+        dc = np.arange(self.tempSize[1]) - int(self.tempSize[1]/2)
+        self.pyrMaps = (self.factors[:, None] * dr, self.factors[:, None] * dc)
+        self.unitMaps = (dr[None].astype(float), dc[None].astype(float))
+
+    def resample(self, maps):
+        """
+        Resample templates at current object scale times relative
+        scales of given interpolation maps by bilinear interpolation.
+
+        Parameters
+        ----------
+        maps : tuple of numpy arrays
+            vertical and horizontal offsets of sample positions,
+            of shape (K, H) and (K, W).
+
+        Returns
+        -------
+        f : numpy array
+            grayscale templates of shape (K, H, W).
+
+        """
+        dr = self.scale * maps[0]
+        dc = self.scale * maps[1]
+
+        # crop grayscale region covering all sample positions
+        ext = (2 * (int(np.ceil(np.abs(dr).max())) + 1) + 1,
+               2 * (int(np.ceil(np.abs(dc).max())) + 1) + 1)
+        if ext in self.boxCroppers:
+            self.boxCroppers.move_to_end(ext)
+        else:
+            self.boxCroppers[ext] = Cropper(ext, self.cropper.mode,
+                                            self.cropper.cval, self.dtype)
+            if len(self.boxCroppers) > self.maxBoxCroppers:
+                self.boxCroppers.popitem(last=False)
+        box = self.boxCroppers[ext].crop(self.I, self.objPos)
+
+        # sample positions in region
+        r = dr + int(ext[0]/2)
+        c = dc + int(ext[1]/2)
+        r0 = np.floor(r).astype(int)
+        c0 = np.floor(c).astype(int)
+        wr = (r - r0).astype(self.dtype)[:, :, None]
+        wc = (c - c0).astype(self.dtype)[:, None, :]
+        R0 = r0[:, :, None]
+        C0 = c0[:, None, :]
+
+        top = (1 - wc) * box[R0, C0] + wc * box[R0, C0 + 1]
+        bottom = (1 - wc) * box[R0 + 1, C0] + wc * box[R0 + 1, C0 + 1]
+
+        return (1 - wr) * top + wr * bottom
+
+    def setBinning(self, binning=2):
+        """
+        Binning is not available for scale pyramids. Only binning 1,
+        i.e. no binning, is accepted.
+
+        Parameters
+        ----------
+        binning : int. optional.
+            edge length of cells. default is 2.
+
+        Returns
+        -------
+        None.
+
+        """
+        if binning != 1:
+            raise ValueError('binning is not available for scale pyramids')
+
+        MOSSE.setBinning(self, binning)
+
+    def cropTemplate(self):
+        """
+        Crop template at current object scale, resampled to template size.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.prof.stage('crop'):
+            if self.scale == 1.:
+                self.f = self.cropper.crop(self.I, self.objPos)
+            else:
+                self.f = self.resample(self.unitMaps)[0]
+
+    def calObjPos(self):
+        """
+        Calculate object position and scale from response of scale
+        pyramid with maximum Peak-to-Sidelobe Ratio.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.prof.stage('crop'):
+            f = self.resample(self.pyrMaps)
+
+        # correlate templates of all scales in one batch
+        with self.prof.stage('fft'):
+            F = self.fft.rfft2(f)
+        with self.prof.stage('respond'):
+            G = self.state.respond(F)
+        with self.prof.stage('ifft'):
+            g = self.fft.irfft2(G, self.tempSize)
+
+        # scale of max PSR and position of its maximum
+        with self.prof.stage('peak'):
+            peaks = resp.findPeaks(g)
+            psr = resp.calPSR(g, peaks)
+            k = int(np.argmax(psr))
+
+            self.peak = float(g[k][tuple(peaks[k])])
+            self.psr = float(psr[k])
+            self.subOffset = resp.refinePeaks(g[k], peaks[k])
+
+        self.f = f[k]
+        self.g = g[k]
+
+        # subpixel displacement in template is scaled to image
+        scale = self.scale * self.factors[k]
+        self.subPos = [self.objPos[0] + (peaks[k, 0] + self.subOffset[0] - int(self.tempSize[0]/2)) * scale,
+                       self.objPos[1] + (peaks[k, 1] + self.subOffset[1] - int(self.tempSize[1]/2)) * scale]
+        self.objPos = [int(round(self.subPos[0])), int(round(self.subPos[1]))]
+
+        self.scale = float(np.clip(scale, self.scaleLimits[0], self.scaleLimits[1]))
+        self.boxSize = [self.tempSize[0] * self.scale, self.tempSize[1] * self.scale]
+
+    def setCropMode(self, mode='edge', cval=0.):
+        """
+        Set filling of template parts outside of image, also of
+        regions resampled at object scale.
+
+        Parameters
+        ----------
+        mode : string. optional.
+            'edge' replicates border pixels, 'constant' uses cval.
+            default is 'edge'.
+        cval : float. optional.
+            value used in mode 'constant'. default is 0.
+
+        Returns
+        -------
+        None.
+
+        """
+        MOSSE.setCropMode(self, mode, cval)
+        self.boxCroppers = OrderedDict()
+
+    def stateHeader(self):
+        """
+        Get parameters and position saved in header of tracker state,
+        including object scale and scale pyramid.
+
+        Returns
+        -------
+        header : dict
+            JSON serializable parameters and position.
+
+        """
+        header = MOSSE.stateHeader(self)
+        header.update({'scale': self.scale,
+                       'boxSize': [float(x) for x in self.boxSize],
+                       'factors': [float(x) for x in self.factors],
+                       'scaleLimits': list(self.scaleLimits)})
+
+        return header
+
+    def setStateHeader(self, header):
+        """
+        Set object scale and scale pyramid from header of loaded
+        tracker state.
+
+        Parameters
+        ----------
+        header : dict
+            header returned by stateHeader.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.scale = header['scale']
+        self.boxSize = header['boxSize']
+        self.scaleLimits = header['scaleLimits']
+        self.setFactors(header['factors'])
+        self.boxCroppers = OrderedDict()
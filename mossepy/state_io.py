@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact binary files of tracker states.
+
+A file consists of a magic string, the length of a JSON header,
+the JSON header and the raw data of all arrays. Arrays are aligned,
+such that they can be memory mapped without copying. Files are
+replaced atomically, such that a state can be saved to the file it
+is memory mapped from.
+
+Created on Sun Oct 17 10:52:44 2021
+
+@author: niklas
+"""
+
+
+import json
+import os
+import struct
+
+import numpy as np
+
+
+MAGIC = b'MOSSEPY\x00'
+# alignment of arrays in bytes
+ALIGN = 64
+
+
+def _aligned(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+def save(path, header, arrays):
+    """
+    Save header and arrays to state file. The file is written to a
+    temporary file first and replaces an existing file only when it
+    is complete. Arrays memory mapped from an existing file stay valid.
+
+    Parameters
+    ----------
+    path : string
+        path of state file.
+    header : dict
+        JSON serializable header, e.g. parameters.
+    arrays : dict of numpy arrays
+        arrays to be saved.
+
+    Returns
+    -------
+    None.
+
+    """
+    # locate arrays relative to aligned end of header
+    layout = {}
+    offset = 0
+    for name, arr in arrays.items():
+        layout[name] = {'dtype': arr.dtype.str,
+                        'shape': list(arr.shape),
+                        'offset': offset}
+        offset = _aligned(offset + arr.nbytes)
+
+    header = dict(header, arrays=layout)
+    text = json.dumps(header).encode()
+    start = _aligned(len(MAGIC) + 4 + len(text))
+
+    with open(path + '.tmp', 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<I', len(text)))
+        file.write(text)
+
+        for name, arr in arrays.items():
+            file.seek(start + layout[name]['offset'])
+            file.write(np.ascontiguousarray(arr).tobytes())
+
+    os.replace(path + '.tmp', path)
+
+
+def load(path, mmap=True):
+    """
+    Load header and arrays from state file.
+
+    Parameters
+    ----------
+    path : string
+        path of state file.
+    mmap : bool. optional.
+        if True, arrays are read-only memory maps of file.
+        default is True.
+
+    Returns
+    -------
+    header : dict
+        header of file.
+    arrays : dict of numpy arrays
+        arrays of file.
+
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('not a tracker state file: ' + path)
+
+        length = struct.unpack('<I', file.read(4))[0]
+        header = json.loads(file.read(length).decode())
+
+    start = _aligned(len(MAGIC) + 4 + length)
+
+    arrays = {}
+    for name, loc in header.pop('arrays').items():
+        dtype = np.dtype(loc['dtype'])
+        shape = tuple(loc['shape'])
+        offset = start + loc['offset']
+
+        if mmap:
+            arrays[name] = np.memmap(path, dtype, 'r', offset, shape)
+        else:
+            count = int(np.prod(shape))
+            arrays[name] = np.fromfile(path, dtype, count, offset=offset).reshape(shape)
+
+    return header, arrays
@@ -10,11 +10,11 @@ Created on Thu Nov 19 11:39:05 2020
 
 
 import numpy as np
-import scipy.linalg as la
-import scipy.ndimage as nd
 
+from mossepy.warp import getWarper
 
-def rgb2Gray(Iin):
+
+def rgb2Gray(Iin, dtype=None):
     """
     convert RGB image array to grayscale
     
@@ -22,6 +22,9 @@ def rgb2Gray(Iin):
     ----------
     Iin : numpy array
         RGB image array
+    dtype : numpy dtype. optional.
+        float type of output. default is None, i.e. type of input
+        for grayscale input and float64 for RGB input.
     
     Returns
     -------
@@ -29,6 +32,9 @@ def rgb2Gray(Iin):
         grayscale image array
         
     """
+    if dtype is not None:
+        Iin = Iin.astype(dtype, copy=False)
+        
     # is already grayscale image
     if np.size(Iin.shape) == 2:
         Iout = Iin
@@ -61,10 +67,10 @@ def gauss2D(valRange, size, mu, sigma):
         2D Gaussian array.
 
     """
-    # create grid
+    # create grid, x along first and y along second axis
     x = np.linspace(0, size[0]-1, size[0])
-    y = np.linspace(0, size[0]-1, size[0])
-    X, Y = np.meshgrid(x, y)
+    y = np.linspace(0, size[1]-1, size[1])
+    X, Y = np.meshgrid(x, y, indexing='ij')
     
     # exponents for 1D Gaussians
     xExponent = -(X - mu[0])**2 / (2.0 * sigma[0]**2)
@@ -78,7 +84,8 @@ def gauss2D(valRange, size, mu, sigma):
     
 def randWarp(Iin, size, angMax = 10.0, scaleExt = [0.9, 1.1], tRel = 40):
     """
-    randomly warp image
+    randomly warp image. Rotation, scaling and translation are
+    combined into one affine map and interpolated bilinearly.
 
     Parameters
     ----------
@@ -99,57 +106,85 @@ def randWarp(Iin, size, angMax = 10.0, scaleExt = [0.9, 1.1], tRel = 40):
         output image.
 
     """
-    # rotation angle
-    angDeg = np.random.uniform(-angMax, angMax)
-    angRad = np.radians(angDeg)
-    c = np.cos(angRad)
-    s = np.sin(angRad)
-    
-    # scaling factor
-    scale = np.random.uniform(scaleExt[0], scaleExt[1])
+    # parameters are drawn from global random state
+    warper = getWarper(size, angMax, scaleExt, tRel)
     
-    # translation vector
-    tMax = [int(size[0]/tRel), int(size[1]/tRel)]
-    t = [np.random.uniform(-tMax[0], tMax[0]), np.random.uniform(-tMax[1], tMax[1])]
-    
-    # rotation and scaling matrix
-    R = np.zeros((2, 2))
-    R[0, 0] = c
-    R[0, 1] = s
-    R[1, 0] = -s
-    R[1, 1] = c
-    R  = scale * R
-
-    # rotation axis in center of image
-    p = np.array([size[0]/2, size[1]/2])
-    p = p.reshape(2,1)
-    # get offset for transform
-    o = p - np.dot(la.inv(R), p)
-    o = o.flatten()
+    return warper.warp(Iin, 1, np.random)[0]
+
+
+def randWarpBatch(Iin, size, n, rng=None, angMax = 10.0, scaleExt = [0.9, 1.1], tRel = 40):
+    """
+    randomly warp image n times. Rotation, scaling and translation
+    are combined into one affine map per sample and all samples are
+    interpolated bilinearly by a cached warper.
+
+    Parameters
+    ----------
+    Iin : numpy array
+        input image.
+    size : list of ints
+        x and y size of image.
+    n : int
+        number of warped samples.
+    rng : numpy Generator. optional.
+        random number generator. default is None, i.e. unseeded.
+    angMax : float. optional.
+        max rotation angle in deg. default is 10.
+    scaleExt : list. optional.
+        min and max scaling factor. default is [0.9, 1.1].
+    tRel : int. optional.
+        max relative translation. default is 40.
+
+    Returns
+    -------
+    Iout : numpy array
+        stack of n output images.
+
+    """
+    if rng is None:
+        rng = np.random.default_rng()
     
-    # apply random rotation and scaling
-    # prefilter is set to False, because it produces negative values
-    # order is set to 1 to avoid blurring
-    Iout = nd.affine_transform(Iin, la.inv(R), o, order=1, mode='nearest', prefilter=False)
+    return getWarper(size, angMax, scaleExt, tRel).warp(Iin, n, rng)
+
+
+def hanning2D(size):
+    """
+    calculate 2D Hanning window used in pre-processing.
 
-    # apply random translation
-    Iout = nd.affine_transform(Iout, np.eye(2), t, mode='nearest', prefilter=False)
-            
-    return Iout        
+    Parameters
+    ----------
+    size : list of ints
+        x and y size of window.
 
+    Returns
+    -------
+    win2D : numpy array
+        2D Hanning window.
 
-def preProcess(Iin, size, eps=0.1):
     """
-    pre-process image according to MOSSE pre-processing steps
+    win0 = np.hanning(size[0])
+    win1 = np.hanning(size[1])
+    win2D = np.sqrt(np.outer(win0, win1))
+    
+    return win2D
+
+
+def preProcess(Iin, size, eps=0.1, win=None):
+    """
+    pre-process image according to MOSSE pre-processing steps.
+    Trackers use a Preprocessor with reused buffers instead.
 
     Parameters
     ----------
     Iin : numpy array
-        input image.
+        input image or stack of images along first axis.
     size : list of ints
         x and y size of image.
     eps : float. optional.
         regularization parameter. default is 0.1.
+    win : numpy array. optional.
+        precomputed 2D Hanning window of given size.
+        default is None, i.e. cached window is used.
 
     Returns
     -------
@@ -157,16 +192,12 @@ def preProcess(Iin, size, eps=0.1):
         output image.
 
     """
-    # log transform
-    Iout = np.log(Iin + 1.)
-    
-    # normalize
-    Iout = (Iout - np.mean(Iout)) / (np.std(Iout) + eps)
+    # imported here, as pre-processor uses routines of this module
+    from mossepy.preprocess import Preprocessor
     
-    # multiply with 2D Hanning window to reduce edge effects
-    win0 = np.hanning(size[0])
-    win1 = np.hanning(size[1])
-    win2D = np.sqrt(np.outer(win0, win1))
-    Iout = Iout * win2D
+    dtype = Iin.dtype if Iin.dtype.kind == 'f' else np.float64
+    pre = Preprocessor(size, eps, dtype)
+    if win is not None:
+        pre.win = win
     
-    return Iout
\ No newline at end of file
+    return pre.process(Iin, np.empty(Iin.shape, dtype=dtype))
@@ -9,8 +9,13 @@ Created on Thu Nov 19 11:24:28 2020
 """
 
 
+import time
+
+import numpy as np
 import matplotlib.pylab as plt
 from mpl_toolkits.axes_grid1 import make_axes_locatable
+
+from mossepy.result_writer import toValRange
     
 
 def comp3Heat(M1, M2, M3, title1='template', title2='filter', title3='response'):
@@ -64,6 +69,118 @@ def comp3Heat(M1, M2, M3, title1='template', title2='filter', title3='response')
     
     plt.show()
 
+
+class LiveView(object):
+    """
+    Live view of template, filter and response. Observer of trackers.
+    
+    The figure is created once and its image data are updated in place,
+    at most once per refresh interval.
+    """
+    
+    def __init__(self, valRange, interval=0.2,
+                 title1='template', title2='filter', title3='response'):
+        """
+        constructor of live view class.
+
+        Parameters
+        ----------
+        valRange : int
+            image value range.
+        interval : float. optional.
+            min time between refreshs in s. default is 0.2.
+        title1 : string. optional.
+            name of first array. default is 'template'.
+        title2 : string. optional.
+            name of second array. default is 'filter'.
+        title3 : string. optional.
+            name of third array. default is 'response'.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.valRange = valRange
+        self.interval = interval
+        self.titles = [title1, title2, title3]
+        
+        self.fig = None
+        self.last = -np.inf
+        
+    def __call__(self, tracker):
+        """
+        Show current results of tracker, if refresh interval has passed.
+
+        Parameters
+        ----------
+        tracker : Correlation
+            observed tracker.
+
+        Returns
+        -------
+        None.
+
+        """
+        now = time.perf_counter()
+        if now - self.last < self.interval:
+            return
+        self.last = now
+        
+        # spatial filter is only calculated when shown
+        tracker.calSpatialFilter()
+        
+        # fit images to valRange for output
+        f = toValRange(tracker.f, self.valRange)
+        g = toValRange(tracker.g, self.valRange)
+        h = toValRange(tracker.h, self.valRange)
+        
+        self.update(f, abs(np.fft.ifftshift(h)), abs(g))
+        
+    def update(self, M1, M2, M3):
+        """
+        Update heat plots in place. Figure is created on first call.
+
+        Parameters
+        ----------
+        M1 : numpy array
+            template
+        M2 : numpy array
+            MOSSE filter
+        M3 : numpy array
+            response of template to filter
+
+        Returns
+        -------
+        None.
+
+        """
+        Ms = [M1, M2, M3]
+        
+        if self.fig is None:
+            plt.ion()
+            
+            # define figure with subplots
+            self.fig, axes = plt.subplots(nrows = 3)
+            self.imgs = []
+            
+            for ax, M, title in zip(axes, Ms, self.titles):
+                ax.set_title(title)
+                img = ax.imshow(M, vmin=M.min(), vmax=M.max(), cmap='jet')
+                colorBar(img)
+                self.imgs.append(img)
+                
+            # adjust axes placing
+            self.fig.tight_layout(h_pad=1)
+            
+        else:
+            for img, M in zip(self.imgs, Ms):
+                img.set_data(M)
+                img.set_clim(M.min(), M.max())
+                
+        self.fig.canvas.draw_idle()
+        plt.pause(0.001)
+
        
 def colorBar(mappable):
     '''
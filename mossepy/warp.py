@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Random affine warps of templates used in filter training.
+
+Created on Sat Nov 13 09:47:25 2021
+
+@author: niklas
+"""
+
+
+import numpy as np
+
+
+# warpers shared by all trackers of equal template size and
+# perturbation ranges, keyed by (size, angMax, scaleExt, tRel)
+_warperCache = {}
+
+# pixels interpolated at once. Interpolation needs about ten
+# temporaries per pixel, which fit into a L2 cache of ~1 MB at this
+# size. Larger chunks are memory bound: 256 samples of 128x128 pixels
+# take 2-3 times longer in one chunk than one sample per chunk,
+# whereas the loop over chunks costs a few microseconds per chunk.
+CHUNK_PIXELS = 16384
+
+
+class Warper(object):
+    """
+    Generate randomly rotated, scaled and translated copies of a
+    template. Rotation, scaling and translation are composed into one
+    affine map per sample. Coordinate grids are precomputed once per
+    template size and all samples are interpolated bilinearly by
+    vectorized gathers, in chunks of samples fitting into cache, see
+    CHUNK_PIXELS. Templates of 128x128 pixels and more are interpolated
+    one sample per chunk.
+    """
+
+    def __init__(self, size, angMax=10.0, scaleExt=[0.9, 1.1], tRel=40, chunk=None):
+        """
+        constructor of warper class.
+
+        Parameters
+        ----------
+        size : list of ints
+            x and y size of template.
+        angMax : float. optional.
+            max rotation angle in deg. default is 10.
+        scaleExt : list. optional.
+            min and max scaling factor. default is [0.9, 1.1].
+        tRel : int. optional.
+            max relative translation. default is 40.
+        chunk : int. optional.
+            number of samples interpolated at once. default is None,
+            i.e. as many samples as fit into CHUNK_PIXELS, at least one.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.size = size
+        self.angMax = angMax
+        self.scaleExt = scaleExt
+        self.tMax = [int(size[0]/tRel), int(size[1]/tRel)]
+        if chunk is None:
+            chunk = max(1, CHUNK_PIXELS // (size[0] * size[1]))
+        self.chunk = chunk
+
+        # output coordinates relative to rotation axis in center
+        # of template, broadcast to full grids on use
+        self.d0 = (np.arange(size[0]) - size[0]/2)[:, None]
+        self.d1 = (np.arange(size[1]) - size[1]/2)[None, :]
+
+    def sample(self, n, rng):
+        """
+        Draw random parameters of n warps.
+
+        Parameters
+        ----------
+        n : int
+            number of warps.
+        rng : numpy Generator or numpy.random module
+            random number generator.
+
+        Returns
+        -------
+        angRad : numpy array
+            rotation angles in rad.
+        scale : numpy array
+            scaling factors.
+        t0 : numpy array
+            vertical translations.
+        t1 : numpy array
+            horizontal translations.
+
+        """
+        angRad = np.radians(rng.uniform(-self.angMax, self.angMax, n))
+        scale = rng.uniform(self.scaleExt[0], self.scaleExt[1], n)
+        t0 = rng.uniform(-self.tMax[0], self.tMax[0], n)
+        t1 = rng.uniform(-self.tMax[1], self.tMax[1], n)
+
+        return angRad, scale, t0, t1
+
+    def apply(self, Iin, angRad, scale, t0, t1):
+        """
+        Warp template by given affine maps. Coordinates outside of
+        template are clamped to its border.
+
+        Parameters
+        ----------
+        Iin : numpy array
+            input template.
+        angRad : numpy array
+            rotation angles in rad.
+        scale : numpy array
+            scaling factors.
+        t0 : numpy array
+            vertical translations.
+        t1 : numpy array
+            horizontal translations.
+
+        Returns
+        -------
+        Iout : numpy array
+            stack of warped templates.
+
+        """
+        H, W = self.size
+        n = len(angRad)
+        dtype = Iin.dtype if Iin.dtype.kind == 'f' else np.float64
+
+        flat = np.ascontiguousarray(Iin, dtype=dtype).ravel()
+        Iout = np.empty((n, H, W), dtype=dtype)
+
+        # entries of inverse rotation and scaling matrices
+        c = (np.cos(angRad) / scale)[:, None, None]
+        s = (np.sin(angRad) / scale)[:, None, None]
+        # translated rotation axis
+        p0 = H/2 + c * t0[:, None, None] - s * t1[:, None, None]
+        p1 = W/2 + s * t0[:, None, None] + c * t1[:, None, None]
+
+        for k in range(0, n, self.chunk):
+            sl = slice(k, k + self.chunk)
+
+            # input coordinates, clamped to template
+            r = np.clip(c[sl] * self.d0 - s[sl] * self.d1 + p0[sl], 0, H - 1)
+            q = np.clip(s[sl] * self.d0 + c[sl] * self.d1 + p1[sl], 0, W - 1)
+
+            # upper left neighbours and interpolation weights
+            r0 = np.minimum(r.astype(np.intp), H - 2)
+            q0 = np.minimum(q.astype(np.intp), W - 2)
+            wr = (r - r0).astype(dtype)
+            wq = (q - q0).astype(dtype)
+
+            idx = r0 * W + q0
+            top = flat[idx]
+            top += wq * (flat[idx + 1] - top)
+            bottom = flat[idx + W]
+            bottom += wq * (flat[idx + W + 1] - bottom)
+
+            np.multiply(wr, bottom - top, out=Iout[sl])
+            Iout[sl] += top
+
+        return Iout
+
+    def warp(self, Iin, n, rng):
+        """
+        Randomly warp template n times.
+
+        Parameters
+        ----------
+        Iin : numpy array
+            input template.
+        n : int
+            number of warped samples.
+        rng : numpy Generator or numpy.random module
+            random number generator.
+
+        Returns
+        -------
+        Iout : numpy array
+            stack of n warped templates.
+
+        """
+        return self.apply(Iin, *self.sample(n, rng))
+
+
+def getWarper(size, angMax=10.0, scaleExt=[0.9, 1.1], tRel=40):
+    """
+    Get warper for given template size and perturbation ranges.
+    Warpers are created once and cached.
+
+    Parameters
+    ----------
+    size : list of ints
+        x and y size of template.
+    angMax : float. optional.
+        max rotation angle in deg. default is 10.
+    scaleExt : list. optional.
+        min and max scaling factor. default is [0.9, 1.1].
+    tRel : int. optional.
+        max relative translation. default is 40.
+
+    Returns
+    -------
+    warper : Warper
+        cached warper.
+
+    """
+    key = (tuple(size), angMax, tuple(scaleExt), tRel)
+
+    if key not in _warperCache:
+        _warperCache[key] = Warper(size, angMax, scaleExt, tRel)
+
+    return _warperCache[key]